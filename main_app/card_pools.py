@@ -0,0 +1,79 @@
+from django.db import transaction
+from .models import Card, CardPack, CardPool, Room
+import hashlib
+
+# Packs a room plays with when none are selected
+DEFAULT_PACK_NAMES = ["CAH Base Set", "CAH: First Expansion", "CAH: Second Expansion", "CAH: Third Expansion"]
+
+
+def fingerprint(pack_ids):
+  """sha1 of the sorted pack ids, so every room with the same packs shares one pool"""
+  key = ','.join(str(pack_id) for pack_id in sorted(set(pack_ids)))
+  return hashlib.sha1(key.encode()).hexdigest()
+
+
+def room_pack_ids(room):
+  """The room's selected packs, or the default packs if it has none"""
+  pack_ids = list(room.selected_packs.values_list('id', flat=True))
+  if not pack_ids:
+    pack_ids = list(CardPack.objects.filter(name__in=DEFAULT_PACK_NAMES).values_list('id', flat=True))
+  return pack_ids
+
+
+@transaction.atomic
+def get_pool(pack_ids):
+  """The shared pool for a set of packs, materialized with one card query the first time"""
+  key = fingerprint(pack_ids)
+  pool = CardPool.objects.filter(fingerprint=key).first()
+  if pool is not None:
+    return pool
+
+  white_ids = []
+  black_ids = []
+  cards = Card.objects.filter(pack_id__in=pack_ids, is_active=True).order_by('id')
+  for card_id, card_type in cards.values_list('id', 'card_type'):
+    if card_type == 'white':
+      white_ids.append(card_id)
+    else:
+      black_ids.append(card_id)
+
+  # Another room may have built the same pool meanwhile - the unique fingerprint picks one
+  pool, created = CardPool.objects.get_or_create(
+    fingerprint=key,
+    defaults={'white_ids': white_ids, 'black_ids': black_ids}
+  )
+  if created:
+    pool.packs.set(pack_ids)
+  return pool
+
+
+def assign_room_pool(room):
+  """Point a room at the pool for its packs - call when a room is created or its packs change"""
+  room.card_pool = get_pool(room_pack_ids(room))
+  Room.objects.filter(pk=room.pk).update(card_pool=room.card_pool)
+  return room.card_pool
+
+
+def room_pool(room):
+  """The room's pool, assigning a fresh one if it has none or its pool was invalidated"""
+  pool = CardPool.objects.filter(pk=room.card_pool_id).first() if room.card_pool_id else None
+  return pool or assign_room_pool(room)
+
+
+def invalidate_pools(pack_ids=None):
+  """Drop the pools built from these packs (every pool if pack_ids is None) and return how many.
+
+  Called by the commands that add or change cards. Rooms lose their pool and
+  build a current one when their next game starts; games already running
+  keep the cards they were dealt from.
+  """
+  pools = CardPool.objects.all()
+  if pack_ids is not None:
+    pack_ids = list(pack_ids)
+    if CardPack.objects.filter(id__in=pack_ids, name__in=DEFAULT_PACK_NAMES).exists():
+      # A default pack may be new - rooms without a selection need to resolve the defaults again
+      Room.objects.filter(selected_packs=None).update(card_pool=None)
+    pools = pools.filter(id__in=CardPool.objects.filter(packs__in=pack_ids).values('id'))
+
+  _, deleted = pools.delete()
+  return deleted.get(CardPool._meta.label, 0)
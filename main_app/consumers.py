@@ -0,0 +1,64 @@
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from .models import RoomMembership
+from .realtime import get_broker, room_channel
+
+
+def _session_key(scope):
+  """Read the session cookie from the socket handshake headers"""
+  for name, value in scope.get('headers', []):
+    if name == b'cookie':
+      cookie = SimpleCookie(value.decode('latin-1'))
+      if settings.SESSION_COOKIE_NAME in cookie:
+        return cookie[settings.SESSION_COOKIE_NAME].value
+  return None
+
+
+@sync_to_async
+def _is_room_member(session_key, room_code):
+  """Resolve the logged-in user from the session and check room membership"""
+  if not session_key:
+    return False
+  engine = import_module(settings.SESSION_ENGINE)
+  user = get_user(SimpleNamespace(session=engine.SessionStore(session_key)))
+  if not user.is_authenticated:
+    return False
+  return RoomMembership.objects.filter(
+    user=user,
+    room__room_code=room_code,
+    room__is_active=True,
+    is_active=True
+  ).exists()
+
+
+async def room_socket(scope, receive, send, room_code):
+  """Push room update events to a member's browser over a WebSocket"""
+  message = await receive()
+  if message['type'] != 'websocket.connect':
+    return
+
+  if not await _is_room_member(_session_key(scope), room_code):
+    await send({'type': 'websocket.close', 'code': 4403})
+    return
+
+  await send({'type': 'websocket.accept'})
+
+  async def forward_events():
+    async for event in get_broker().subscribe(room_channel(room_code)):
+      await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+  forwarder = asyncio.ensure_future(forward_events())
+  try:
+    # Clients never need to talk back; just wait for them to leave
+    while True:
+      message = await receive()
+      if message['type'] == 'websocket.disconnect':
+        break
+  finally:
+    forwarder.cancel()
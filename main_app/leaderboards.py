@@ -0,0 +1,104 @@
+from django.db.models import Case, F, OuterRef, Q, Subquery, When
+from django.utils import timezone
+from .models import GamePlayer, LeaderboardEntry
+
+GLOBAL_BOARD = 'global'
+
+# Ranking order; the last column breaks ties so every entry has one position
+RANK_ORDER = ('-games_won', '-total_score', 'user_id')
+
+
+def room_board(room_code):
+  return f'room:{room_code}'
+
+
+def week_board(when=None):
+  year, week, _ = timezone.localtime(when or timezone.now()).isocalendar()
+  return f'week:{year}-W{week:02d}'
+
+
+def record_game(game):
+  """Add a finished game to the global, room and weekly boards of every player.
+
+  Same shape as GameService.settle_stats: one insert for missing entries and
+  one UPDATE of the running totals, however many players or boards.
+  """
+  boards = [GLOBAL_BOARD, room_board(game.room.room_code), week_board(game.ended_at)]
+  user_ids = list(game.players.values_list('user_id', flat=True))
+  LeaderboardEntry.objects.bulk_create(
+    [LeaderboardEntry(board=board, user_id=user_id) for board in boards for user_id in user_ids],
+    ignore_conflicts=True
+  )
+
+  score = GamePlayer.objects.filter(game=game, user_id=OuterRef('user_id')).values('score')[:1]
+  LeaderboardEntry.objects.filter(board__in=boards, user_id__in=user_ids).update(
+    games_played=F('games_played') + 1,
+    games_won=Case(
+      When(user_id=game.winner_id, then=F('games_won') + 1),
+      default=F('games_won')
+    ),
+    total_score=F('total_score') + Subquery(score),
+    updated_at=timezone.now()
+  )
+
+
+def encode_cursor(entry):
+  return f'{entry.games_won}.{entry.total_score}.{entry.user_id}'
+
+
+def decode_cursor(cursor):
+  """Turn a cursor back into (games_won, total_score, user_id); ValueError if it's malformed"""
+  games_won, total_score, user_id = (int(part) for part in cursor.split('.'))
+  return games_won, total_score, user_id
+
+
+def ranked_after(games_won, total_score, user_id):
+  """Entries that rank strictly below the given position"""
+  return (
+    Q(games_won__lt=games_won) |
+    Q(games_won=games_won, total_score__lt=total_score) |
+    Q(games_won=games_won, total_score=total_score, user_id__gt=user_id)
+  )
+
+
+def ranked_before(games_won, total_score, user_id):
+  """Entries that rank strictly above the given position"""
+  return (
+    Q(games_won__gt=games_won) |
+    Q(games_won=games_won, total_score__gt=total_score) |
+    Q(games_won=games_won, total_score=total_score, user_id__lt=user_id)
+  )
+
+
+def get_page(board, limit=25, cursor=None):
+  """Return (entries, next cursor) for one page of a board.
+
+  Pages are keyed on the last entry's position rather than an offset, so deep
+  pages cost the same as the first and don't shift while games are ending.
+  """
+  entries = LeaderboardEntry.objects.filter(board=board).select_related('user')
+  if cursor:
+    entries = entries.filter(ranked_after(*decode_cursor(cursor)))
+  entries = list(entries.order_by(*RANK_ORDER)[:limit + 1])
+
+  next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+  return entries[:limit], next_cursor
+
+
+def top(board, count=10):
+  """The first count entries of a board"""
+  return get_page(board, limit=count)[0]
+
+
+def get_rank(board, user):
+  """Return (rank, entry) for a user on a board, or (None, None) if they aren't on it"""
+  entry = LeaderboardEntry.objects.filter(board=board, user=user).first()
+  if entry is None:
+    return None, None
+
+  # Everyone ranked above is a range of the rank index - no sort of the whole board
+  ahead = LeaderboardEntry.objects.filter(
+    ranked_before(entry.games_won, entry.total_score, entry.user_id),
+    board=board
+  ).count()
+  return ahead + 1, entry
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from main_app.models import Game
+from main_app.services import GameService
+
+
+class Command(BaseCommand):
+    help = 'Archive finished games into GameHistory and drop their rounds and submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Games loaded per batch (default: 100)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many games would be archived without archiving them',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Games that ended before archiving ran at game end (or whose archive failed)
+        pending = Game.objects.filter(status='ended', history__isnull=True)
+        count = pending.count()
+
+        if count == 0:
+            self.stdout.write(self.style.SUCCESS('No finished games left to archive.'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Would archive {count} games'))
+            return
+
+        archived = 0
+        last_id = 0
+        while True:
+            # One transaction per game, so a bad game doesn't hold back the rest
+            batch = list(pending.filter(id__gt=last_id).select_related('room').order_by('id')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for game in batch:
+                try:
+                    GameService.archive_game(game)
+                    archived += 1
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'  Failed to archive game {game.id}: {e}'))
+            self.stdout.write(f'  Archived {archived}/{count} games...')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully archived {archived} games.'))
@@ -1,7 +1,47 @@
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 from django.utils import timezone
 from datetime import timedelta
-from main_app.models import Room
+from main_app.models import Room, RoomMembership, Game, GamePlayer, HandCard, Round, CardSubmission, SubmissionCard, GameHistory
+
+
+def delete_in(cursor, model, column, ids_query):
+    """One raw DELETE of the model's rows whose column is in a subquery - no collector, no signals"""
+    sql, params = ids_query.query.sql_with_params()
+    cursor.execute(
+        f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+        f'WHERE {connection.ops.quote_name(column)} IN ({sql})',
+        params
+    )
+    return cursor.rowcount
+
+
+def purge_rooms(room_ids):
+    """Delete rooms and everything under them with one statement per table, children first.
+
+    Rows pointing back up the tree (Game.current_round, Round.winning_submission)
+    and archived histories are unlinked first, so every DELETE only removes
+    rows nothing references.
+    """
+    rooms = Room.objects.filter(id__in=room_ids)
+    games = Game.objects.filter(room__in=rooms)
+    rounds = Round.objects.filter(game__in=games)
+    submissions = CardSubmission.objects.filter(round__in=rounds)
+    players = GamePlayer.objects.filter(game__in=games)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        GameHistory.objects.filter(game__in=games).update(game=None)
+        games.update(current_round=None)
+        rounds.update(winning_submission=None)
+        delete_in(cursor, SubmissionCard, 'submission_id', submissions.values('id'))
+        delete_in(cursor, CardSubmission, 'round_id', rounds.values('id'))
+        delete_in(cursor, Round, 'game_id', games.values('id'))
+        delete_in(cursor, HandCard, 'player_id', players.values('id'))
+        delete_in(cursor, GamePlayer, 'game_id', games.values('id'))
+        delete_in(cursor, Game, 'room_id', rooms.values('id'))
+        delete_in(cursor, RoomMembership, 'room_id', rooms.values('id'))
+        delete_in(cursor, Room.selected_packs.through, 'room_id', rooms.values('id'))
+        return delete_in(cursor, Room, 'id', rooms.values('id'))
 
 
 class Command(BaseCommand):
@@ -19,27 +59,37 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting',
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Purge each batch with raw DELETEs per table instead of the ORM cascade',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Rooms deleted per transaction (default: 100)',
+        )
 
     def handle(self, *args, **options):
         days = options['days']
         dry_run = options['dry_run']
+        batch_size = options['batch_size']
         
         # Calculate cutoff date
         cutoff_date = timezone.now() - timedelta(days=days)
         
-        # Find inactive rooms
-        # For now, use created_at since we don't have last_activity field yet
-        # After Task 11 is implemented, change this to use last_activity
+        # Find inactive rooms (served by the is_active/last_activity index)
         inactive_rooms = Room.objects.filter(
-            created_at__lt=cutoff_date,
-            is_active=True
+            is_active=True,
+            last_activity__lt=cutoff_date
         )
         
         count = inactive_rooms.count()
         
         if count == 0:
             self.stdout.write(
-                self.style.SUCCESS(f'No rooms older than {days} days found.')
+                self.style.SUCCESS(f'No rooms inactive for {days} days found.')
             )
             return
         
@@ -50,7 +100,7 @@ class Command(BaseCommand):
             for room in inactive_rooms[:10]:  # Show first 10
                 self.stdout.write(
                     f'  - {room.name} ({room.room_code}) - '
-                    f'Created: {room.created_at}'
+                    f'Last active: {room.last_activity}'
                 )
             if count > 10:
                 self.stdout.write(f'  ... and {count - 10} more')
@@ -60,18 +110,26 @@ class Command(BaseCommand):
                 self.style.WARNING(f'Deleting {count} inactive rooms...')
             )
             
-            # Delete in batches to avoid memory issues
+            # Walk the ids in order so each batch is a short transaction
             deleted = 0
-            batch_size = 100
+            last_id = 0
             
-            while inactive_rooms.exists():
-                batch_ids = list(inactive_rooms.values_list('id', flat=True)[:batch_size])
-                Room.objects.filter(id__in=batch_ids).delete()
+            while True:
+                batch_ids = list(
+                    inactive_rooms.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+                )
+                if not batch_ids:
+                    break
+                last_id = batch_ids[-1]
+                if options['bulk']:
+                    purge_rooms(batch_ids)
+                else:
+                    Room.objects.filter(id__in=batch_ids).delete()
                 deleted += len(batch_ids)
                 self.stdout.write(f'  Deleted {deleted}/{count} rooms...')
             
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Successfully deleted {deleted} rooms older than {days} days.'
+                    f'Successfully deleted {deleted} rooms inactive for {days} days.'
                 )
-            )
\ No newline at end of file
+            )
@@ -1,74 +1,89 @@
 from django.core.management.base import BaseCommand
 from main_app.models import Card, CardPack
+from main_app.utils.json_stream import iter_array
+import csv
 import json
 import os
 
+REPORT_FIELDS = ['status', 'type', 'text', 'api_pack', 'db_packs']
+
 class Command(BaseCommand):
     help = 'Find cards that exist in the API but not in the database'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=os.path.join('card_data', 'cards_final.json'),
+            help='Path to the cards_final.json file'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['text', 'json', 'csv'],
+            default='text',
+            help='Report format - json and csv print one record per card for scripts (default: text)'
+        )
+
+    def load_index(self):
+        """Map every card text in the database to the ids of the packs holding it (one pass)"""
+        index = {}
+        total = 0
+        for text, pack_id in Card.objects.values_list('text', 'pack_id').iterator(chunk_size=5000):
+            index.setdefault(text, set()).add(pack_id)
+            total += 1
+        return index, total
+
     def handle(self, *args, **options):
-        # Load the API data
-        data_file = os.path.join('card_data', 'cards_final.json')
-        with open(data_file, 'r') as f:
-            api_data = json.load(f)
+        report_format = options['format']
+        pack_ids = dict(CardPack.objects.values_list('name', 'id'))
+        pack_names = {pack_id: name for name, pack_id in pack_ids.items()}
+        index, total_records = self.load_index()
 
-        self.stdout.write("Checking for missing cards...\n")
+        if report_format == 'text':
+            self.stdout.write("Checking for missing cards...\n")
 
         missing_black = []
         missing_white = []
         duplicate_cards = []
+        unknown_packs = []
 
-        for pack_data in api_data:
-            pack_name = pack_data.get('name', '').strip()
-            if not pack_name:
-                continue
-            
-            try:
-                pack = CardPack.objects.get(name=pack_name)
-            except CardPack.DoesNotExist:
-                self.stdout.write(f"Pack not found in DB: {pack_name}")
-                continue
-            
-            # Get all cards for this pack from DB
-            db_cards = set(Card.objects.filter(pack=pack).values_list('text', flat=True))
-            
-            # Check black cards
-            for card in pack_data.get('black', []):
-                text = card.get('text', '').strip()
-                if text and text not in db_cards:
-                    # Check if this card exists in another pack
-                    other_pack = Card.objects.filter(text=text).exclude(pack=pack).first()
-                    if other_pack:
-                        duplicate_cards.append({
-                            'text': text,
-                            'type': 'black',
-                            'api_pack': pack_name,
-                            'db_pack': other_pack.pack.name
-                        })
-                    else:
-                        missing_black.append({
-                            'pack': pack_name,
-                            'text': text
-                        })
-            
-            # Check white cards
-            for card in pack_data.get('white', []):
-                text = card.get('text', '').strip()
-                if text and text not in db_cards:
-                    # Check if this card exists in another pack
-                    other_pack = Card.objects.filter(text=text).exclude(pack=pack).first()
-                    if other_pack:
-                        duplicate_cards.append({
-                            'text': text,
-                            'type': 'white',
-                            'api_pack': pack_name,
-                            'db_pack': other_pack.pack.name
-                        })
-                    else:
-                        missing_white.append({
-                            'pack': pack_name,
-                            'text': text
-                        })
+        # Diff the file against the index as it streams past
+        with open(options['file'], 'r', encoding='utf-8') as f:
+            for pack_data in iter_array(f):
+                pack_name = pack_data.get('name', '').strip()
+                if not pack_name:
+                    continue
+
+                pack_id = pack_ids.get(pack_name)
+                if pack_id is None:
+                    unknown_packs.append(pack_name)
+                    continue
+
+                for card_type, missing in (('black', missing_black), ('white', missing_white)):
+                    for card in pack_data.get(card_type, []):
+                        text = card.get('text', '').strip()
+                        holders = index.get(text, ())
+                        if not text or pack_id in holders:
+                            continue
+                        if holders:
+                            # The card exists, just filed under another pack
+                            duplicate_cards.append({
+                                'text': text,
+                                'type': card_type,
+                                'api_pack': pack_name,
+                                'db_pack': ', '.join(sorted(pack_names[other] for other in holders))
+                            })
+                        else:
+                            missing.append({
+                                'pack': pack_name,
+                                'text': text
+                            })
+
+        if report_format != 'text':
+            self.write_records(report_format, missing_black, missing_white, duplicate_cards)
+            return
+
+        for pack_name in unknown_packs:
+            self.stdout.write(f"Pack not found in DB: {pack_name}")
 
         # Report findings
         self.stdout.write(f"\nMissing black cards: {len(missing_black)}")
@@ -104,8 +119,25 @@ class Command(BaseCommand):
             if len(duplicate_cards) > 20:
                 self.stdout.write(f"... and {len(duplicate_cards) - 20} more duplicates")
 
-        # Summary of unique texts
-        all_texts_db = set(Card.objects.values_list('text', flat=True))
+        # Summary of unique texts (from the index - no second pass over the table)
         self.stdout.write("\nSummary:")
-        self.stdout.write(f"Total unique card texts in database: {len(all_texts_db)}")
-        self.stdout.write(f"Total card records in database: {Card.objects.count()}")
\ No newline at end of file
+        self.stdout.write(f"Total unique card texts in database: {len(index)}")
+        self.stdout.write(f"Total card records in database: {total_records}")
+
+    def write_records(self, report_format, missing_black, missing_white, duplicate_cards):
+        """Print one flat record per missing or misfiled card"""
+        records = [
+            {'status': 'missing', 'type': card_type, 'text': card['text'], 'api_pack': card['pack'], 'db_packs': ''}
+            for card_type, missing in (('black', missing_black), ('white', missing_white))
+            for card in missing
+        ] + [
+            {'status': 'duplicate', 'type': card['type'], 'text': card['text'], 'api_pack': card['api_pack'], 'db_packs': card['db_pack']}
+            for card in duplicate_cards
+        ]
+
+        if report_format == 'json':
+            self.stdout.write(json.dumps(records, indent=2))
+        else:
+            writer = csv.DictWriter(self.stdout, fieldnames=REPORT_FIELDS, lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(records)
@@ -1,11 +1,11 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from main_app.models import Card
-import re
+from main_app.utils.card_import import source_pick
 
 
 class Command(BaseCommand):
-    help = 'Fix pick values for cards based on actual number of blanks in text'
+    help = 'Fix missing or invalid pick values for black cards from their number of blanks'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,84 +13,108 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be changed without making changes',
         )
+        parser.add_argument(
+            '--no-input',
+            action='store_true',
+            help='Apply the changes without asking for confirmation',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Cards read and updated per batch (default: 2000)',
+        )
+
+    def changed_chunks(self, chunk_size):
+        """Stream black cards and yield each chunk's changes as (id, pack, old_pick, new_pick, text).
+
+        Uses the import rule (source_pick): a valid pick is kept even when the
+        text has fewer blanks, so multi-pick cards without underscores survive.
+        """
+        black_cards = Card.objects.filter(card_type='black').values_list('id', 'text', 'pick', 'pack__name')
+        self.total_cards = 0
+        chunk = []
+        for card_id, text, pick, pack_name in black_cards.iterator(chunk_size=chunk_size):
+            self.total_cards += 1
+            new_pick = source_pick(text, pick)
+            if new_pick != pick:
+                chunk.append((card_id, pack_name, pick, new_pick, text[:80]))
+            if self.total_cards % chunk_size == 0 and chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def summarize(self, chunk_size):
+        """Count the changes by type and keep a few examples, without holding the changed cards"""
+        by_change = {}
+        examples = []
+        for chunk in self.changed_chunks(chunk_size):
+            for card_id, pack_name, old_pick, new_pick, text in chunk:
+                key = f'{old_pick} -> {new_pick}'
+                by_change[key] = by_change.get(key, 0) + 1
+                if len(examples) < 5:
+                    examples.append((pack_name, text, old_pick, new_pick))
+        return by_change, examples
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
+        chunk_size = options['chunk_size']
         
         if dry_run:
             self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
         
-        # Find all black cards
-        black_cards = Card.objects.filter(card_type='black')
-        total_cards = black_cards.count()
-        
-        self.stdout.write(f'Checking {total_cards} black cards...')
-        
-        cards_to_update = []
-        
-        for card in black_cards:
-            # Count blanks - any sequence of 1 or more underscores
-            blanks = re.findall(r'_+', card.text)
-            actual_blank_count = len(blanks)
+        if dry_run or not options['no_input']:
+            self.stdout.write('Checking black cards...')
+            by_change, examples = self.summarize(chunk_size)
+            self.stdout.write(f'Checked {self.total_cards} black cards')
             
-            # Check if pick value needs updating
-            if actual_blank_count != card.pick:
-                cards_to_update.append({
-                    'card': card,
-                    'old_pick': card.pick,
-                    'new_pick': actual_blank_count,
-                    'text': card.text[:80]
-                })
-        
-        if not cards_to_update:
-            self.stdout.write(self.style.SUCCESS('All cards have correct pick values!'))
-            return
+            total_changes = sum(by_change.values())
+            if not total_changes:
+                self.stdout.write(self.style.SUCCESS('All cards have correct pick values!'))
+                return
+            
+            # Show summary
+            self.stdout.write(f'\nFound {total_changes} cards needing updates:')
+            for change_type, count in sorted(by_change.items()):
+                self.stdout.write(f'  {change_type}: {count} cards')
+            
+            # Show examples
+            self.stdout.write('\nExample cards to be updated:')
+            for pack_name, text, old_pick, new_pick in examples:
+                self.stdout.write(f'  [{pack_name}] "{text}..." (pick: {old_pick} -> {new_pick})')
+            
+            if dry_run:
+                self.stdout.write(self.style.WARNING('\nDRY RUN - No changes made'))
+                return
+            
+            # Confirm before making changes
+            confirm = input(f'\nUpdate {total_changes} cards? (yes/no): ')
+            if confirm.lower() != 'yes':
+                self.stdout.write(self.style.WARNING('Cancelled'))
+                return
         
-        # Group by change type for summary
+        # Write each chunk's changes as it is read, one UPDATE per chunk
         by_change = {}
-        for update in cards_to_update:
-            key = f"{update['old_pick']} -> {update['new_pick']}"
-            if key not in by_change:
-                by_change[key] = []
-            by_change[key].append(update)
-        
-        # Show summary
-        self.stdout.write(f'\nFound {len(cards_to_update)} cards needing updates:')
-        for change_type, updates in sorted(by_change.items()):
-            self.stdout.write(f'  {change_type}: {len(updates)} cards')
-        
-        # Show examples
-        self.stdout.write('\nExample cards to be updated:')
-        for update in cards_to_update[:5]:
-            self.stdout.write(
-                f'  [{update["card"].pack.name}] "{update["text"]}..." '
-                f'(pick: {update["old_pick"]} -> {update["new_pick"]})'
-            )
-        
-        if dry_run:
-            self.stdout.write(self.style.WARNING('\nDRY RUN - No changes made'))
-            return
+        with transaction.atomic():
+            for chunk in self.changed_chunks(chunk_size):
+                Card.objects.bulk_update(
+                    [Card(id=card_id, pick=new_pick) for card_id, _, _, new_pick, _ in chunk],
+                    ['pick']
+                )
+                for _, _, old_pick, new_pick, _ in chunk:
+                    key = f'{old_pick} -> {new_pick}'
+                    by_change[key] = by_change.get(key, 0) + 1
         
-        # Confirm before making changes
-        confirm = input(f'\nUpdate {len(cards_to_update)} cards? (yes/no): ')
-        if confirm.lower() != 'yes':
-            self.stdout.write(self.style.WARNING('Cancelled'))
+        if not by_change:
+            self.stdout.write(self.style.SUCCESS('All cards have correct pick values!'))
             return
         
-        # Update cards
-        with transaction.atomic():
-            updated = 0
-            for update in cards_to_update:
-                card = update['card']
-                card.pick = update['new_pick']
-                card.save()
-                updated += 1
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'\nSuccessfully updated {updated} cards!')
-            )
+        self.stdout.write(
+            self.style.SUCCESS(f'\nSuccessfully updated {sum(by_change.values())} cards!')
+        )
         
         # Show final summary
         self.stdout.write('\nUpdate summary:')
-        for change_type, updates in sorted(by_change.items()):
-            self.stdout.write(f'  {change_type}: {len(updates)} cards updated')
\ No newline at end of file
+        for change_type, count in sorted(by_change.items()):
+            self.stdout.write(f'  {change_type}: {count} cards updated')
@@ -1,14 +1,37 @@
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from main_app import card_pools
 from main_app.models import CardPack, Card
-import json
+from main_app.utils.card_import import card_writer
+from main_app.utils.json_stream import iter_array
 import os
 
 class Command(BaseCommand):
     help = 'Import card data from JSON file'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=os.path.join('card_data', 'cards_final.json'),
+            help='Path to the cards_final.json file'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Cards written per bulk insert (default: 1000)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Write packs from N worker processes, one transaction per pack batch (default: in-process)'
+        )
+
+    def report_progress(self, writer):
+        self.stdout.write(f'  ... {writer.seen} cards read ({writer.rate:.0f} cards/s)')
+
     def handle(self, *args, **options):
-        data_file = os.path.join('card_data', 'cards_final.json')
+        data_file = options['file']
         
         self.stdout.write(f'Looking for file: {data_file}')
         
@@ -16,83 +39,41 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'File not found: {data_file}'))
             return
         
-        self.stdout.write('File found, loading JSON...')
-        
-        with open(data_file, 'r') as f:
-            data = json.load(f)
-        
-        self.stdout.write(f'Found {len(data)} packs in cards_final.json')
-        
-        total_black = 0
-        total_white = 0
-        
-        for idx, pack_data in enumerate(data, start=1):
-            pack_name = pack_data.get('name', '').strip()
-            if not pack_name:
-                continue
-            
-            self.stdout.write(f'\n[{idx}/{len(data)}] {pack_name}')
-            
-            try:
-                # Get or create pack
-                pack, pack_created = CardPack.objects.get_or_create(name=pack_name)
-                
-                # Get existing cards for this pack to avoid duplicates
-                existing_texts = set(
-                    Card.objects.filter(pack=pack).values_list('text', flat=True)
-                )
-                
-                # Prepare cards to bulk create
-                cards_to_create = []
-                
-                # Process black cards
-                black_cards = pack_data.get('black', [])
-                for card_data in black_cards:
-                    text = card_data.get('text', '').strip()
-                    if text and text not in existing_texts:
-                        cards_to_create.append(Card(
-                            text=text,
-                            card_type='black',
-                            pack=pack
-                        ))
-                        existing_texts.add(text)
-                
-                # Process white cards
-                white_cards = pack_data.get('white', [])
-                for card_data in white_cards:
-                    text = card_data.get('text', '').strip()
-                    if text and text not in existing_texts:
-                        cards_to_create.append(Card(
-                            text=text,
-                            card_type='white',
-                            pack=pack
-                        ))
-                        existing_texts.add(text)
-                
-                # Bulk create all cards for this pack
-                if cards_to_create:
-                    Card.objects.bulk_create(cards_to_create, batch_size=500)
-                    black_created = sum(1 for c in cards_to_create if c.card_type == 'black')
-                    white_created = sum(1 for c in cards_to_create if c.card_type == 'white')
-                    total_black += black_created
-                    total_white += white_created
-                    self.stdout.write(f'  Added: {black_created}B/{white_created}W')
-                else:
-                    self.stdout.write(f'  No new cards to add')
-                
-                # Update pack counts
-                pack.black_card_count = Card.objects.filter(pack=pack, card_type='black').count()
-                pack.white_card_count = Card.objects.filter(pack=pack, card_type='white').count()
-                pack.card_count = pack.black_card_count + pack.white_card_count
-                pack.save()
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'  Error: {e}'))
+        self.stdout.write('File found, streaming packs...')
+
+        writer = card_writer(
+            options['workers'],
+            batch_size=options['batch_size'],
+            progress=self.report_progress
+        )
+
+        # Packs are read one at a time, so memory holds one pack plus one batch
+        with open(data_file, 'r', encoding='utf-8') as f:
+            for idx, pack_data in enumerate(iter_array(f), start=1):
+                pack_name = pack_data.get('name', '').strip()
+                if not pack_name:
+                    continue
+
+                self.stdout.write(f'[{idx}] {pack_name}')
+
+                for card_type in ('black', 'white'):
+                    for card_data in pack_data.get(card_type, []):
+                        writer.add(pack_name, card_type, card_data.get('text', ''), card_data.get('pick'))
+
+        writer.close()
+        for pack_name, error in writer.errors:
+            self.stdout.write(self.style.ERROR(f'  Error in {pack_name}: {error}'))
+
+        # Rooms playing the imported packs get fresh card pools
+        pack_ids = CardPack.objects.filter(name__in=list(writer.packs)).values_list('id', flat=True)
+        invalidated = card_pools.invalidate_pools(pack_ids)
+        self.stdout.write(f'Invalidated {invalidated} card pools')
         
         # Final summary
         self.stdout.write('\n' + '='*50)
         self.stdout.write(self.style.SUCCESS(f'Import complete!'))
-        self.stdout.write(f'New cards: {total_black} black, {total_white} white')
+        self.stdout.write(f'New cards: {writer.created["black"]} black, {writer.created["white"]} white')
+        self.stdout.write(f'Read {writer.seen} cards at {writer.rate:.0f} cards/s')
         
         total_packs = CardPack.objects.count()
         total_db_black = Card.objects.filter(card_type='black').count()
@@ -101,4 +82,4 @@ class Command(BaseCommand):
         self.stdout.write(f'\nDatabase totals:')
         self.stdout.write(f'  Packs: {total_packs}')
         self.stdout.write(f'  Black cards: {total_db_black}')
-        self.stdout.write(f'  White cards: {total_db_white}')
\ No newline at end of file
+        self.stdout.write(f'  White cards: {total_db_white}')
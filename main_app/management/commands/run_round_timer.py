@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+from main_app.models import Round
+from main_app.realtime import invalidate_game_status_cache
+from main_app.services import GameService
+import heapq
+import time
+
+
+class Command(BaseCommand):
+    help = 'Advance round phases when their timers run out (run as a worker process)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            type=float,
+            default=5,
+            help='Seconds between reloads of active round deadlines (default: 5)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Advance every round that is already due, then exit',
+        )
+
+    def live_deadlines(self, **filters):
+        """(deadline, round id, room code) of every live round matching the filters"""
+        rounds = Round.objects.filter(
+            game__status='active',
+            game__current_round=F('pk'),
+            status__in=['card_selection', 'judging'],
+            **filters
+        ).values_list('id', 'phase_start_time', 'game__room__turn_time_limit', 'game__room__room_code')
+
+        return [
+            (phase_start_time + timedelta(seconds=time_limit), round_id, room_code)
+            for round_id, phase_start_time, time_limit, room_code in rounds
+        ]
+
+    def load_deadlines(self):
+        """Build a heap of the deadlines of every live round"""
+        deadlines = self.live_deadlines()
+        heapq.heapify(deadlines)
+        return deadlines
+
+    def fire_due(self, deadlines):
+        """Advance every round whose deadline has passed"""
+        now = timezone.now()
+        while deadlines and deadlines[0][0] <= now:
+            _, round_id, room_code = heapq.heappop(deadlines)
+            try:
+                if GameService.advance_expired_round(round_id):
+                    invalidate_game_status_cache(room_code)
+                    self.stdout.write(f'Advanced round {round_id} in room {room_code}')
+                    # The new phase (or next round) has its own deadline - watch it now, not at the next reload
+                    for deadline in self.live_deadlines(game__room__room_code=room_code):
+                        heapq.heappush(deadlines, deadline)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Failed to advance round {round_id}: {e}'))
+
+    def handle(self, *args, **options):
+        refresh = options['refresh']
+
+        if options['once']:
+            self.fire_due(self.load_deadlines())
+            return
+
+        self.stdout.write(self.style.SUCCESS('Round timer running...'))
+        while True:
+            close_old_connections()
+            deadlines = self.load_deadlines()
+            reload_at = time.monotonic() + refresh
+
+            # Fire deadlines as they come due until it's time to pick up new rounds
+            while time.monotonic() < reload_at:
+                self.fire_due(deadlines)
+                wait = reload_at - time.monotonic()
+                if deadlines:
+                    wait = min(wait, (deadlines[0][0] - timezone.now()).total_seconds())
+                time.sleep(max(0.05, wait))
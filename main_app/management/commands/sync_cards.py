@@ -1,8 +1,11 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Count, Q
 import requests
-from main_app.models import CardPack, Card
-from main_app.utils.api_client import CardsAPIClient
+from main_app import card_pools
+from main_app.models import CardPack, Card, HandCard, SubmissionCard
+from main_app.utils.api_client import CardsAPIClient, AsyncCardsAPIClient
+from main_app.utils.card_import import source_pick
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,14 +25,25 @@ class Command(BaseCommand):
             nargs='+',
             help='Specific pack names to sync (default: all packs)',
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Number of packs to fetch from the API at once (default: 8)',
+        )
 
     def handle(self, *args, **options):
         api_client = CardsAPIClient()
         
         if options['clear']:
             self.stdout.write(self.style.WARNING('Clearing all existing cards...'))
-            Card.objects.all().delete()
-            CardPack.objects.all().delete()
+            # Cards still in a running game's hands or submissions are deactivated, not deleted
+            in_play = Q(id__in=HandCard.objects.values('card_id')) | Q(id__in=SubmissionCard.objects.values('card_id'))
+            kept = Card.objects.filter(in_play).update(is_active=False)
+            Card.objects.exclude(in_play).delete()
+            CardPack.objects.filter(cards=None).delete()
+            if kept:
+                self.stdout.write(f'Deactivated {kept} cards still in play')
             self.stdout.write(self.style.SUCCESS('All cards cleared.'))
         
         # Get list of packs to sync
@@ -47,9 +61,18 @@ class Command(BaseCommand):
                 )
                 return
         
+        # Fetch every pack up front, several at a time
+        self.stdout.write(f'Fetching {len(pack_names)} packs ({options["concurrency"]} at a time)...')
+        fetcher = AsyncCardsAPIClient(max_concurrency=options['concurrency'])
+        try:
+            fetched = fetcher.get_packs(pack_names)
+        finally:
+            fetcher.close()
+
         # Process each pack
         total_cards = 0
         successful_packs = 0
+        synced_pack_ids = []
         
         for pack_name in pack_names:
             try:
@@ -66,9 +89,11 @@ class Command(BaseCommand):
                 else:
                     self.stdout.write(f'  Updating existing pack: {pack_name}')
                 
-                # Fetch cards for this pack
-                cards_data = api_client.get_cards([pack_name])
-                
+                # Cards for this pack (or the error fetching them)
+                cards_data = fetched[pack_name]
+                if isinstance(cards_data, Exception):
+                    raise cards_data
+
                 if not cards_data:
                     self.stdout.write(
                         self.style.WARNING(f'  No cards returned for {pack_name}')
@@ -79,44 +104,41 @@ class Command(BaseCommand):
                 black_cards = cards_data.get('black', [])
                 white_cards = cards_data.get('white', [])
                 
-                pack_total = 0
-                
                 # Use transaction for better performance
                 with transaction.atomic():
-                    # Process black cards
+                    # Key the incoming cards like the unique constraint (duplicates collapse)
+                    incoming = {}
                     for card_data in black_cards:
-                        card, created = Card.objects.update_or_create(
-                            text=card_data['text'],
-                            card_type='black',
-                            pack=pack,
-                            defaults={
-                                'pick': card_data.get('pick', 1),
-                                'is_active': True
-                            }
-                        )
-                        if created:
-                            pack_total += 1
-                    
-                    # Process white cards
+                        incoming[(card_data['text'], 'black')] = source_pick(card_data['text'], card_data.get('pick'))
                     for card_data in white_cards:
-                        card, created = Card.objects.update_or_create(
-                            text=card_data['text'],
-                            card_type='white',
-                            pack=pack,
-                            defaults={
-                                'pick': 1,
-                                'is_active': True
-                            }
-                        )
-                        if created:
-                            pack_total += 1
-                    
-                    # Update pack statistics
-                    pack.black_card_count = pack.cards.filter(card_type='black').count()
-                    pack.white_card_count = pack.cards.filter(card_type='white').count()
+                        incoming[(card_data['text'], 'white')] = 1
+
+                    # Which of them the pack already has (ONE QUERY)
+                    existing_keys = set(pack.cards.values_list('text', 'card_type'))
+                    pack_total = len(incoming.keys() - existing_keys)
+
+                    # Insert new cards and refresh existing ones in one upsert per batch
+                    Card.objects.bulk_create(
+                        [
+                            Card(text=text, card_type=card_type, pack=pack, pick=pick, is_active=True)
+                            for (text, card_type), pick in incoming.items()
+                        ],
+                        batch_size=1000,
+                        update_conflicts=True,
+                        unique_fields=['text', 'card_type', 'pack'],
+                        update_fields=['pick', 'is_active'],
+                    )
+
+                    # Update pack statistics (ONE QUERY)
+                    counts = pack.cards.aggregate(
+                        black=Count('id', filter=Q(card_type='black')),
+                        white=Count('id', filter=Q(card_type='white')),
+                    )
+                    pack.black_card_count = counts['black']
+                    pack.white_card_count = counts['white']
                     pack.card_count = pack.black_card_count + pack.white_card_count
-                    pack.save()
-                
+                    pack.save(update_fields=['black_card_count', 'white_card_count', 'card_count'])
+
                 self.stdout.write(
                     self.style.SUCCESS(
                         f'  Synced {pack_total} new cards '
@@ -127,6 +149,7 @@ class Command(BaseCommand):
                 
                 total_cards += pack_total
                 successful_packs += 1
+                synced_pack_ids.append(pack.id)
                 
             except Exception as e:
                 self.stdout.write(
@@ -134,6 +157,10 @@ class Command(BaseCommand):
                 )
                 continue
         
+        # Rooms playing these packs get fresh card pools (all of them after --clear)
+        invalidated = card_pools.invalidate_pools(None if options['clear'] else synced_pack_ids)
+        self.stdout.write(f'Invalidated {invalidated} card pools')
+
         # Final summary
         self.stdout.write('\n' + '='*50)
         self.stdout.write(
@@ -146,8 +173,11 @@ class Command(BaseCommand):
         
         # Overall statistics
         total_packs = CardPack.objects.count()
-        total_black = Card.objects.filter(card_type='black').count()
-        total_white = Card.objects.filter(card_type='white').count()
+        totals = Card.objects.aggregate(
+            black=Count('id', filter=Q(card_type='black')),
+            white=Count('id', filter=Q(card_type='white')),
+        )
+        total_black, total_white = totals['black'], totals['white']
         
         self.stdout.write(
             f'\nDatabase totals: {total_packs} packs, '
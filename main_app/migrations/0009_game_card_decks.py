@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_cardpack_room_selected_packs_card'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='black_deck',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='black_deck_cursor',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='white_deck',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='white_deck_cursor',
+            field=models.IntegerField(default=0),
+        ),
+    ]
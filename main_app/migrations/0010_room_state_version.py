@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_game_card_decks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='state_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
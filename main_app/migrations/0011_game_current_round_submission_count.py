@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Point games at their latest round and count existing submissions"""
+    Game = apps.get_model('main_app', 'Game')
+    Round = apps.get_model('main_app', 'Round')
+    CardSubmission = apps.get_model('main_app', 'CardSubmission')
+
+    latest_round = Round.objects.filter(game=OuterRef('pk')).order_by('-round_number')
+    Game.objects.update(
+        current_round=Subquery(latest_round.values('pk')[:1]),
+        current_round_number=Coalesce(Subquery(latest_round.values('round_number')[:1]), 0),
+    )
+
+    submission_count = (
+        CardSubmission.objects.filter(round=OuterRef('pk'))
+        .order_by()
+        .values('round')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Round.objects.filter(pk__in=CardSubmission.objects.values('round')).update(
+        submission_count=Subquery(submission_count)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_room_state_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='current_round',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main_app.round'),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='submission_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:34
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def backfill_boards(apps, schema_editor):
+    """Seed the global board from UserStats and room/week boards from ended games"""
+    UserStats = apps.get_model('main_app', 'UserStats')
+    GamePlayer = apps.get_model('main_app', 'GamePlayer')
+    LeaderboardEntry = apps.get_model('main_app', 'LeaderboardEntry')
+
+    totals = {}
+    for stats in UserStats.objects.filter(games_played__gt=0).iterator():
+        totals[('global', stats.user_id)] = [stats.games_played, stats.games_won, stats.total_score]
+
+    # Room and weekly boards can only be rebuilt from games that still exist
+    rebuilt = defaultdict(lambda: [0, 0, 0])
+    players = GamePlayer.objects.filter(game__status='ended').values_list(
+        'user_id', 'score', 'game__winner_id', 'game__room__room_code', 'game__ended_at', 'game__created_at'
+    )
+    for user_id, score, winner_id, room_code, ended_at, created_at in players.iterator():
+        year, week, _ = (ended_at or created_at).isocalendar()
+        for board in (f'room:{room_code}', f'week:{year}-W{week:02d}'):
+            entry = rebuilt[(board, user_id)]
+            entry[0] += 1
+            entry[1] += int(winner_id == user_id)
+            entry[2] += score
+    totals.update(rebuilt)
+
+    LeaderboardEntry.objects.bulk_create([
+        LeaderboardEntry(board=board, user_id=user_id, games_played=played, games_won=won, total_score=score)
+        for (board, user_id), (played, won, score) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_game_current_round_submission_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=40)),
+                ('games_played', models.IntegerField(default=0)),
+                ('games_won', models.IntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', '-games_won', '-total_score', 'user'], name='leaderboard_rank_idx')],
+                'unique_together': {('board', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_boards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:43
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_last_activity(apps, schema_editor):
+    """Existing rooms were last touched when they were last saved"""
+    Room = apps.get_model('main_app', 'Room')
+    Room.objects.update(last_activity=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_leaderboard_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['is_active', 'last_activity'], name='main_app_ro_is_acti_5999f3_idx'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Matches GameService.API_PACK_NAME
+API_PACK_NAME = 'API Cards'
+
+
+def move_json_cards(apps, schema_editor):
+    """Turn JSON hands and submissions into rows pointing at Card.
+
+    Deck-dealt cards carry their Card id; API-dealt ones only have a random id,
+    so they are matched (or stored) by text in the inactive API pack.
+    """
+    Card = apps.get_model('main_app', 'Card')
+    CardPack = apps.get_model('main_app', 'CardPack')
+    GamePlayer = apps.get_model('main_app', 'GamePlayer')
+    CardSubmission = apps.get_model('main_app', 'CardSubmission')
+    HandCard = apps.get_model('main_app', 'HandCard')
+    SubmissionCard = apps.get_model('main_app', 'SubmissionCard')
+
+    def resolve(cards):
+        ids = [int(card['id']) for card in cards if str(card.get('id', '')).isdigit()]
+        known = Card.objects.in_bulk(ids)
+        resolved = []
+        for card in cards:
+            card_id = str(card.get('id', ''))
+            db_card = known.get(int(card_id)) if card_id.isdigit() else None
+            if db_card is None or db_card.text != card['text']:
+                pack, _ = CardPack.objects.get_or_create(
+                    name=API_PACK_NAME,
+                    defaults={'description': 'Cards dealt from the API fallback', 'is_active': False}
+                )
+                db_card, _ = Card.objects.get_or_create(
+                    text=card['text'], card_type='white', pack=pack, defaults={'is_active': False}
+                )
+            resolved.append(db_card.id)
+        return resolved
+
+    for player in GamePlayer.objects.iterator():
+        if not player.card_hand:
+            continue
+        hand = []
+        for card_id in resolve(player.card_hand):
+            if card_id not in hand:
+                hand.append(card_id)
+        HandCard.objects.bulk_create([
+            HandCard(player_id=player.id, card_id=card_id, slot=slot) for slot, card_id in enumerate(hand)
+        ])
+
+    for submission in CardSubmission.objects.iterator():
+        if not submission.white_cards:
+            continue
+        SubmissionCard.objects.bulk_create([
+            SubmissionCard(submission_id=submission.id, card_id=card_id, position=position)
+            for position, card_id in enumerate(resolve(submission.white_cards))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0014_game_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HandCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_app.card')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hand_cards', to='main_app.gameplayer')),
+            ],
+            options={
+                'ordering': ['slot'],
+                'unique_together': {('player', 'card'), ('player', 'slot')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SubmissionCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_app.card')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cards', to='main_app.cardsubmission')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('submission', 'position')},
+            },
+        ),
+        migrations.RunPython(move_json_cards, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='cardsubmission',
+            name='white_cards',
+        ),
+        migrations.RemoveField(
+            model_name='gameplayer',
+            name='card_hand',
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+def to_bitsets(apps, schema_editor):
+    """Rebuild dealt tracking for games still in play.
+
+    Deck games have dealt everything before their cursor; API games have
+    dealt the stored API cards whose texts were in the old list.
+    """
+    Game = apps.get_model('main_app', 'Game')
+    Card = apps.get_model('main_app', 'Card')
+    for game in Game.objects.exclude(status='ended').iterator():
+        if game.white_deck:
+            pool = sorted(game.white_deck)
+            dealt = game.white_deck[:game.white_deck_cursor]
+        else:
+            pool = dealt = list(Card.objects.filter(
+                pack__name='API Cards', card_type='white', text__in=game.dealt_white_texts or []
+            ).values_list('id', flat=True))
+        positions = {card_id: i for i, card_id in enumerate(pool)}
+        bits = 0
+        for card_id in dealt:
+            bits |= 1 << positions[card_id]
+        game.white_pool = pool
+        game.dealt_white_cards = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        game.save(update_fields=['white_pool', 'dealt_white_cards'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0015_hand_cards'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='game',
+            old_name='dealt_white_cards',
+            new_name='dealt_white_texts',
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='white_pool',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='dealt_white_cards',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(to_bitsets, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='game',
+            name='dealt_white_texts',
+        ),
+    ]
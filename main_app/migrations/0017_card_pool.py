@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0016_game_dealt_bitset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('white_ids', models.JSONField(default=list)),
+                ('black_ids', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('packs', models.ManyToManyField(related_name='pools', to='main_app.cardpack')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='card_pool',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rooms', to='main_app.cardpool'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:24
+
+from django.db import migrations
+
+
+def to_deck_positions(apps, schema_editor):
+    """Key dealt bits to white_deck positions for games still in play.
+
+    Dealt cards move to the front of the deck, ahead of the cards not drawn
+    yet, and the cursor goes to just past them. API games track their cards
+    through hands and submissions, so they drop their bits.
+    """
+    Game = apps.get_model('main_app', 'Game')
+    for game in Game.objects.exclude(status='ended').iterator():
+        dealt = []
+        if game.white_deck:
+            bits = int.from_bytes(game.dealt_white_cards or b'', 'little')
+            dealt = [card_id for position, card_id in enumerate(game.white_pool) if bits >> position & 1]
+            game.white_deck = dealt + game.white_deck[game.white_deck_cursor:]
+            game.white_deck_cursor = len(dealt)
+        bits = (1 << len(dealt)) - 1
+        game.dealt_white_cards = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        game.save(update_fields=['white_deck', 'white_deck_cursor', 'dealt_white_cards'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0017_card_pool'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_deck_positions, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='game',
+            name='white_pool',
+        ),
+    ]
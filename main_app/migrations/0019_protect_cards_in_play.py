@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0018_game_single_white_deck'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='handcard',
+            name='card',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='main_app.card'),
+        ),
+        migrations.AlterField(
+            model_name='submissioncard',
+            name='card',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='main_app.card'),
+        ),
+    ]
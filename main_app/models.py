@@ -3,6 +3,8 @@ from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 import string
 import random
+import json
+import zlib
 
 class User(AbstractUser):
     """Custom User model to replace date_joined with created_at/updated_at"""
@@ -35,6 +37,28 @@ class UserStats(models.Model):
     def __str__(self):
         return f"{self.user.username} Stats"
 
+class LeaderboardEntry(models.Model):
+    """One user's running totals on one leaderboard, updated as games end.
+
+    board is 'global', 'room:<room code>' or 'week:<ISO year>-W<week>'.
+    """
+    board = models.CharField(max_length=40)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    games_played = models.IntegerField(default=0)
+    games_won = models.IntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('board', 'user')
+        indexes = [
+            # Rank order within a board, so top-N, pages and rank counts are index range scans
+            models.Index(fields=['board', '-games_won', '-total_score', 'user'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} on {self.board}"
+
 class CardPack(models.Model):
     """Store card pack information"""
     name = models.CharField(max_length=200, unique=True)
@@ -79,6 +103,22 @@ class Card(models.Model):
         ]
 
 
+class CardPool(models.Model):
+    """The playable card ids of one pack selection, shared by every room that selects it.
+
+    fingerprint is a sha1 of the sorted pack ids (see card_pools). A pool is
+    built once, dropped when cards in its packs change and rebuilt on next use.
+    """
+    fingerprint = models.CharField(max_length=40, unique=True)
+    packs = models.ManyToManyField(CardPack, related_name='pools')
+    white_ids = models.JSONField(default=list)  # Active white Card ids, in id order
+    black_ids = models.JSONField(default=list)  # Active black Card ids, in id order
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pool {self.fingerprint[:8]} ({len(self.white_ids)} white, {len(self.black_ids)} black)"
+
+
 class Room(models.Model):
     room_code = models.CharField(max_length=6, unique=True)
     name = models.CharField(max_length=100)
@@ -87,10 +127,18 @@ class Room(models.Model):
     round_limit = models.IntegerField(default=10)
     turn_time_limit = models.IntegerField(default=120)  # seconds
     selected_packs = models.ManyToManyField(CardPack, related_name='rooms', blank=True)
+    card_pool = models.ForeignKey(CardPool, on_delete=models.SET_NULL, null=True, blank=True, related_name='rooms')  # Set by card_pools.assign_room_pool
     is_active = models.BooleanField(default=True)
+    state_version = models.PositiveIntegerField(default=0)  # Bumped on every lobby/game change, used as ETag
+    last_activity = models.DateTimeField(default=timezone.now)  # Bumped alongside state_version
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'last_activity']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.room_code:
             self.room_code = self.generate_room_code()
@@ -121,24 +169,38 @@ class Game(models.Model):
     room = models.OneToOneField(Room, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
     current_round_number = models.IntegerField(default=0)
+    current_round = models.ForeignKey('Round', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)
     ended_at = models.DateTimeField(null=True, blank=True)
-    dealt_white_cards = models.JSONField(default=list)  # Track all dealt white card texts
+    dealt_white_cards = models.BinaryField(default=b'')  # Bitset (utils.bitset) of white_deck positions out of the deck: in hands, on the table or discarded
+    white_deck = models.JSONField(default=list)  # Every white Card id of the game, shuffled at game start; drawn from the cursor on
+    black_deck = models.JSONField(default=list)  # Shuffled black Card ids, built at game start
+    white_deck_cursor = models.IntegerField(default=0)  # Index of the next white card to draw
+    black_deck_cursor = models.IntegerField(default=0)  # Index of the next black card to draw
 
 class GamePlayer(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='players')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     score = models.IntegerField(default=0)
     turn_order = models.IntegerField(default=0)
-    card_hand = models.JSONField(default=list)  # Store full card objects
     is_active = models.BooleanField(default=True)
 
     class Meta:
         unique_together = ('game', 'user')
         ordering = ['turn_order']
 
+class HandCard(models.Model):
+    """One white card in a player's hand; slot is its position in the hand"""
+    player = models.ForeignKey(GamePlayer, on_delete=models.CASCADE, related_name='hand_cards')
+    card = models.ForeignKey(Card, on_delete=models.PROTECT, related_name='+')  # Cards in a live game can't be deleted under it
+    slot = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = [('player', 'slot'), ('player', 'card')]
+        ordering = ['slot']
+
 class Round(models.Model):
     STATUS_CHOICES = [
         ('card_selection', 'Players Selecting Cards'),
@@ -157,15 +219,59 @@ class Round(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     ended_at = models.DateTimeField(null=True, blank=True)
     phase_start_time = models.DateTimeField(default=timezone.now)
+    submission_count = models.IntegerField(default=0)  # Kept in step with submissions by GameService.submit_card
     class Meta:
         unique_together = ('game', 'round_number')
 
 class CardSubmission(models.Model):
     round = models.ForeignKey(Round, on_delete=models.CASCADE, related_name='submissions')
     player = models.ForeignKey(GamePlayer, on_delete=models.CASCADE)
-    white_cards = models.JSONField(default=list)  # List of white card objects
     is_winner = models.BooleanField(default=False)
     submitted_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('round', 'player')
\ No newline at end of file
+        unique_together = ('round', 'player')
+
+class SubmissionCard(models.Model):
+    """A white card played in a submission, in the order it fills the black card's blanks"""
+    submission = models.ForeignKey(CardSubmission, on_delete=models.CASCADE, related_name='cards')
+    card = models.ForeignKey(Card, on_delete=models.PROTECT, related_name='+')  # Cards in a live game can't be deleted under it
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('submission', 'position')
+        ordering = ['position']
+
+class GameHistory(models.Model):
+    """A finished game compacted into one row once its rounds and submissions are dropped.
+
+    data is zlib-compressed JSON: {'players': [...], 'rounds': [...]}, each round
+    carrying its black card, judge, winner and submissions. The summary columns
+    cover the usual queries without decompressing anything.
+    """
+    game = models.OneToOneField(Game, on_delete=models.SET_NULL, null=True, blank=True, related_name='history')
+    room_code = models.CharField(max_length=6)
+    room_name = models.CharField(max_length=100)
+    winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='won_game_histories')
+    player_count = models.IntegerField(default=0)
+    round_count = models.IntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room_code', 'ended_at']),
+        ]
+
+    @staticmethod
+    def pack(data):
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+
+    def unpack(self):
+        """The archived players and rounds"""
+        return json.loads(zlib.decompress(self.data))
+
+    def __str__(self):
+        return f"{self.room_name} ({self.room_code}) - {self.ended_at}"
@@ -0,0 +1,58 @@
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.db.models import Prefetch
+from .models import Game, GamePlayer, SubmissionCard
+
+
+def load_game_screen(room_code, user):
+  """Load everything the game screen renders in a fixed number of queries.
+
+  Raises Http404 if the room or game doesn't exist and GamePlayer.DoesNotExist
+  if the user isn't playing in it.
+  """
+  # Room, game, creator and current round with its judge in one query
+  game = get_object_or_404(
+    Game.objects.select_related('room', 'room__creator', 'current_round', 'current_round__judge'),
+    room__room_code=room_code,
+    room__is_active=True
+  )
+  room = game.room
+
+  # Every player and their user in one query; ours is picked out in Python
+  players = list(game.players.select_related('user'))
+  player = next((p for p in players if p.user_id == user.id), None)
+  if player is None:
+    raise GamePlayer.DoesNotExist
+
+  current_round = game.current_round
+
+  # The player's hand with its cards in one query
+  hand = list(player.hand_cards.select_related('card'))
+
+  # Submissions with their players, then all their cards in one more query
+  submissions = []
+  if current_round:
+    submissions = list(current_round.submissions.select_related('player__user').prefetch_related(
+      Prefetch('cards', queryset=SubmissionCard.objects.select_related('card'))
+    ))
+  has_submitted = any(submission.player_id == player.id for submission in submissions)
+
+  # Calculate remaining time if there's an active round
+  remaining_time = None
+  if current_round and current_round.status in ['card_selection', 'judging']:
+    elapsed = (timezone.now() - current_round.phase_start_time).total_seconds()
+    remaining_time = max(0, room.turn_time_limit - int(elapsed))
+
+  return {
+    'room': room,
+    'game': game,
+    'player': player,
+    'hand': hand,
+    'current_round': current_round,
+    'is_judge': current_round and current_round.judge_id == user.id,
+    'is_creator': room.creator_id == user.id,
+    'has_submitted': has_submitted,
+    'submissions': submissions,
+    'players': players,
+    'remaining_time': remaining_time,
+  }
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Room
+
+try:
+  import redis
+  import redis.asyncio
+except ImportError:  # Only needed for RedisBroker
+  redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+  """Pub/sub for room events between views and sockets in this process.
+
+  Views publish from worker threads; sockets subscribe from the ASGI event
+  loop. Any class with the same publish/subscribe methods (e.g. one backed
+  by Redis) can be swapped in through settings.REALTIME_BROKER.
+  """
+
+  def __init__(self):
+    self._subscribers = defaultdict(set)
+    self._lock = threading.Lock()
+
+  def publish(self, channel, message):
+    """Deliver a message to every current subscriber of a channel"""
+    with self._lock:
+      subscribers = list(self._subscribers.get(channel, ()))
+
+    for loop, queue in subscribers:
+      try:
+        loop.call_soon_threadsafe(queue.put_nowait, message)
+      except RuntimeError:
+        # Subscriber's event loop already shut down
+        pass
+
+  async def subscribe(self, channel):
+    """Yield messages published to a channel until the caller stops iterating"""
+    subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+    with self._lock:
+      self._subscribers[channel].add(subscriber)
+
+    try:
+      while True:
+        yield await subscriber[1].get()
+    finally:
+      with self._lock:
+        self._subscribers[channel].discard(subscriber)
+        if not self._subscribers[channel]:
+          del self._subscribers[channel]
+
+
+class RedisBroker:
+  """Pub/sub through Redis channels, for more than one process.
+
+  Events published by any web worker or by the run_round_timer worker reach
+  sockets served by every web worker. Used whenever REDIS_URL is set.
+  """
+
+  def __init__(self, url=None):
+    if redis is None:
+      raise ImportError('RedisBroker needs the redis package')
+    self.url = url or settings.REDIS_URL
+    self._client = redis.Redis.from_url(self.url)
+
+  def publish(self, channel, message):
+    self._client.publish(channel, json.dumps(message))
+
+  async def subscribe(self, channel):
+    """Yield messages published to a channel until the caller stops iterating"""
+    client = redis.asyncio.Redis.from_url(self.url)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(channel)
+    try:
+      async for message in pubsub.listen():
+        if message['type'] == 'message':
+          yield json.loads(message['data'])
+    finally:
+      await pubsub.unsubscribe(channel)
+      await pubsub.aclose()
+      await client.aclose()
+
+
+_broker = None
+
+
+def get_broker():
+  """Return the process-wide broker configured in settings"""
+  global _broker
+  if _broker is None:
+    _broker = import_string(settings.REALTIME_BROKER)()
+  return _broker
+
+
+def room_channel(room_code):
+  return f'room_{room_code}'
+
+
+def publish_room_update(room_code):
+  """Tell everyone watching a room that its lobby or game state changed.
+
+  The change has already been saved, so a broker outage is logged rather than
+  failing the request - polling clients still see the bumped state_version.
+  """
+  try:
+    get_broker().publish(room_channel(room_code), {'type': 'room.updated', 'room_code': room_code})
+  except Exception:
+    logger.exception('Could not publish an update for room %s', room_code)
+
+
+def invalidate_game_status_cache(room_code):
+  """Move a room to a new state version and notify its sockets.
+
+  Cached game status is keyed by the version, so bumping it retires the old
+  entry everywhere at once - including other processes' local cache tiers.
+  The same UPDATE marks the room as active for delete_inactive_rooms.
+  """
+  Room.objects.filter(room_code=room_code).update(
+    state_version=F('state_version') + 1,
+    last_activity=timezone.now()
+  )
+  publish_room_update(room_code)
+
+
+def invalidate_member_rooms(user):
+  """Bump every room the user is an active member of - their name and avatar show in its lobby"""
+  room_codes = Room.objects.filter(
+    memberships__user=user,
+    memberships__is_active=True
+  ).values_list('room_code', flat=True)
+  for room_code in list(room_codes):
+    invalidate_game_status_cache(room_code)
@@ -1,44 +1,19 @@
 from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, When
 from django.utils import timezone
-from .models import Game, GamePlayer, Round, CardSubmission, UserStats, Card, CardPack
+from datetime import timedelta
+from .models import Game, GamePlayer, HandCard, Round, CardSubmission, SubmissionCard, UserStats, Card, CardPack, GameHistory
 from .utils.api_client import cards_api
+from .utils.bitset import Bitset
+from . import card_pools, leaderboards
 import random
-import json
 
 class GameService:
   """Service class for managing game logic"""
-  
-  @staticmethod
-  def use_database_cards():
-    """Check if we should use database cards or fall back to API"""
-    # Use database if we have any cards
-    return Card.objects.exists()
-  
-  @staticmethod
-  def get_room_cards(room, card_type=None):
-    """Get cards available for a room based on selected packs"""
-    if not GameService.use_database_cards():
-      # Fall back to API
-      return None
-    
-    # Get cards from selected packs (or default packs if none selected)
-    selected_packs = room.selected_packs.all()
-    if not selected_packs:
-      # Use default packs
-      default_pack_names = ["CAH Base Set", "CAH: First Expansion", "CAH: Second Expansion", "CAH: Third Expansion"]
-      selected_packs = CardPack.objects.filter(name__in=default_pack_names)
-    
-    # Get cards
-    cards = Card.objects.filter(
-      pack__in=selected_packs,
-      is_active=True
-    )
-    
-    if card_type:
-      cards = cards.filter(card_type=card_type)
-    
-    return cards
 
+  # Inactive pack that holds cards dealt from the API, so hands can reference them
+  API_PACK_NAME = 'API Cards'
+  
   @staticmethod
   @transaction.atomic
   def create_game(room):
@@ -50,113 +25,288 @@ class GameService:
     for membership in room.memberships.filter(is_active=True):
       GamePlayer.objects.create(
         game=game,
-        user=membership.user,
-        card_hand=[]  # Will be populated when game starts
+        user=membership.user
       )
 
     return game
 
   @staticmethod
+  def build_decks(game, save=True):
+    """Shuffle the room's card pool into white and black decks for this game.
+
+    Each color is decided on its own: a color the packs have no cards of
+    gets an empty deck and is dealt from the API.
+    """
+    # The room's pool is materialized once per pack selection and shared between rooms
+    pool = card_pools.room_pool(game.room)
+    if not (pool.white_ids or pool.black_ids):
+      # No database cards for these packs - dealing falls back to the API
+      return False
+    white_deck = list(pool.white_ids)
+    black_deck = list(pool.black_ids)
+    random.shuffle(white_deck)
+    random.shuffle(black_deck)
+
+    game.white_deck = white_deck
+    game.black_deck = black_deck
+    game.white_deck_cursor = 0
+    game.black_deck_cursor = 0
+    game.dealt_white_cards = b''
+    if save:
+      game.save(update_fields=['white_deck', 'black_deck', 'white_deck_cursor', 'black_deck_cursor',
+                               'dealt_white_cards'])
+    return True
+
+  @staticmethod
+  def has_deck(game, card_type):
+    """Build the game's decks if needed and report whether this color is dealt from its deck"""
+    if not (game.white_deck or game.black_deck):
+      # Games started before decks existed get theirs on first deal
+      GameService.build_decks(game)
+    return bool(getattr(game, f'{card_type}_deck'))
+
+  @staticmethod
+  def draw_cards(game, card_type, count):
+    """Take up to count Card ids off the top of the game's deck"""
+    deck = getattr(game, f'{card_type}_deck')
+    cursor = getattr(game, f'{card_type}_deck_cursor')
+    drawn = deck[cursor:cursor + count]
+    setattr(game, f'{card_type}_deck_cursor', cursor + len(drawn))
+    return drawn
+
+  @staticmethod
+  def draw_white_cards(game, count):
+    """Draw white Card ids off the deck and set the dealt bits of their deck positions"""
+    start = game.white_deck_cursor
+    card_ids = GameService.draw_cards(game, 'white', count)
+    dealt = Bitset.from_bytes(game.dealt_white_cards)
+    dealt.update(range(start, game.white_deck_cursor))
+    game.dealt_white_cards = dealt.to_bytes()
+    return card_ids
+
+  @staticmethod
+  def white_cards_left(game):
+    """How many of the game's white cards are not out of the deck (in a hand, on the table or discarded)"""
+    return len(game.white_deck) - len(Bitset.from_bytes(game.dealt_white_cards))
+
+  @staticmethod
+  def cards_in_play(game):
+    """Ids of the game's white cards in a hand or on the table of a round still being played"""
+    in_play = set(HandCard.objects.filter(player__game=game).values_list('card_id', flat=True))
+    in_play.update(SubmissionCard.objects.filter(
+      submission__round__game=game
+    ).exclude(submission__round__status='completed').values_list('card_id', flat=True))
+    return in_play
+
+  @staticmethod
+  def reshuffle_discards(game):
+    """Shuffle the discard pile back into the white deck, under the cards not drawn yet.
+
+    The discard pile is every dealt card that is no longer in a hand or on
+    the table: submit_card takes cards out of hands, and they are discarded
+    once their round completes. The deck keeps every white card of the game,
+    so bit i of dealt_white_cards always means white_deck[i]: cards still in
+    play move to the front, the cursor goes to just past them, and only
+    their bits stay set.
+    """
+    in_play = GameService.cards_in_play(game)
+    kept = []
+    discards = []
+    for position in Bitset.from_bytes(game.dealt_white_cards):
+      card_id = game.white_deck[position]
+      (kept if card_id in in_play else discards).append(card_id)
+    random.shuffle(discards)
+    game.white_deck = kept + game.white_deck[game.white_deck_cursor:] + discards
+    game.white_deck_cursor = len(kept)
+    game.dealt_white_cards = Bitset(range(len(kept))).to_bytes()
+
+  @staticmethod
+  def load_cards(card_ids):
+    """Fetch Card rows for the given ids, preserving draw order"""
+    cards = Card.objects.select_related('pack').in_bulk(card_ids)
+    return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+  @staticmethod
+  def lock_game(game_id, status=None, error="Game is not in the expected state"):
+    """Lock a game row, optionally checking its status before anything changes it"""
+    game = Game.objects.select_for_update().get(pk=game_id)
+    if status is not None and game.status != status:
+      raise Exception(error)
+    return game
+
+  @staticmethod
+  def lock_round(round_id, status, error):
+    """Lock a round row and check it is still the game's current round in the given phase.
+
+    Every phase transition goes through here first, so of two racing requests
+    the second always sees the first one's result and backs off.
+    """
+    round_obj = Round.objects.select_for_update(of=('self',)).select_related('game__room').get(pk=round_id)
+    if round_obj.status != status or round_obj.game.current_round_id != round_obj.id:
+      raise Exception(error)
+    return round_obj
+
+  @staticmethod
+  @transaction.atomic
   def start_game(game):
     """Start the game by dealing cards and creating first round"""
-    # Deal white cards to all players
-    players = game.players.all()
-    for player in players:
-      GameService.deal_white_cards(player)
+    # Only one start can win - a double-clicked start finds the game active
+    GameService.lock_game(game.pk, 'waiting', "Game is already in progress")
+
+    # Shuffle this game's decks once up front (saved along with the deal)
+    GameService.build_decks(game, save=False)
+
+    # Deal white cards to all players in one pass
+    GameService.deal_opening_hands(game, list(game.players.all()))
 
     # Create first round
-    return GameService.create_round(game)
+    round_obj = GameService.create_round(game)
+
+    game.status = 'active'
+    game.started_at = timezone.now()
+    game.save(update_fields=['status', 'started_at'])
+    return round_obj
+
+  @staticmethod
+  @transaction.atomic
+  def deal_opening_hands(game, players, count=10):
+    """Deal every player a full hand with one draw, one insert and one game save"""
+    GameService.fill_hands(game, players, count)
+    game.save(update_fields=['white_deck', 'black_deck', 'white_deck_cursor', 'black_deck_cursor',
+                             'dealt_white_cards'])
 
   @staticmethod
   def deal_white_cards(player, count=10):
     """Deal white cards to a player, ensuring no duplicates across the game"""
-    # Get current hand size
-    current_hand = player.card_hand or []
-    needed_cards = count - len(current_hand)
-
-    if needed_cards > 0:
-      # Get the game and track dealt cards
-      game = player.game
-      dealt_cards = set(game.dealt_white_cards or [])
-      
-      # Also get cards currently in all players' hands to avoid duplicates
-      all_player_cards = set()
-      for p in game.players.all():
-        if p.card_hand:
-          all_player_cards.update(card['text'] for card in p.card_hand)
-      
-      # Combine dealt cards with current player cards
-      all_used_cards = dealt_cards | all_player_cards
-      
-      # Keep fetching cards until we have enough unique ones
-      unique_cards = []
-      
-      # Check if we should use database cards
-      room = game.room
-      room_cards = GameService.get_room_cards(room, card_type='white')
-      
-      if room_cards:
-        # Use database cards
-        # Get all available white cards that haven't been used
-        available_cards = room_cards.exclude(text__in=all_used_cards).order_by('?')
-        
-        # Take the needed number of cards
-        for card in available_cards[:needed_cards]:
-          unique_cards.append({
-            'id': str(random.randint(10000, 99999)),  # Generate unique ID
-            'text': card.text,
-            'pack': card.pack.name
-          })
-          all_used_cards.add(card.text)
-      else:
-        # Fall back to API
-        attempts = 0
-        max_attempts = 5  # Prevent infinite loop
-        
-        while len(unique_cards) < needed_cards and attempts < max_attempts:
-          # Fetch more cards than needed to account for duplicates
-          fetch_count = (needed_cards - len(unique_cards)) * 2
-          white_cards = cards_api.get_white_cards(count=fetch_count)
-          
-          # Filter out duplicates
-          for card in white_cards:
-            if card['text'] not in all_used_cards and len(unique_cards) < needed_cards:
-              unique_cards.append({
-                'id': str(random.randint(10000, 99999)),  # Generate unique ID
-                'text': card['text'],
-                'pack': card.get('pack', 'Unknown')
-              })
-              all_used_cards.add(card['text'])
-          
-          attempts += 1
-      
-      # Add to player's hand
-      current_hand.extend(unique_cards)
-
-      # Update player's hand
-      player.card_hand = current_hand
-      player.save()
-      
-      # Update game's dealt cards list
-      game.dealt_white_cards = list(dealt_cards | set(card['text'] for card in unique_cards))
-      game.save()
+    game = player.game
+    update_fields = GameService.fill_hands(game, [player], count)
+    if update_fields:
+      game.save(update_fields=update_fields)
+
+  @staticmethod
+  def fill_hands(game, players, count=10):
+    """Top every player's hand up to count cards with one draw and one insert.
+
+    New cards go into each hand's free slots. Returns the game fields the draw
+    changed, for the caller to save.
+    """
+    taken = {}
+    for player_id, slot in HandCard.objects.filter(player__in=players).values_list('player_id', 'slot'):
+      taken.setdefault(player_id, set()).add(slot)
+    free_slots = {
+      player.id: [slot for slot in range(count) if slot not in taken.get(player.id, ())]
+      for player in players
+    }
+    total_needed = sum(len(slots) for slots in free_slots.values())
+    if not total_needed:
+      return []
+
+    if GameService.has_deck(game, 'white'):
+      # Use database cards - every id in the deck is unique, so just pop
+      update_fields = ['white_deck_cursor', 'dealt_white_cards']
+      if len(game.white_deck) - game.white_deck_cursor < total_needed:
+        # Draw pile is running out - shuffle the discards back in under what's left
+        GameService.reshuffle_discards(game)
+        update_fields.append('white_deck')
+      card_ids = GameService.draw_white_cards(game, total_needed)
+    else:
+      # Fall back to API - the cards' rows say where they are, so the game row doesn't change
+      card_ids = GameService.draw_api_cards(game, total_needed)
+      update_fields = []
+
+    # Split the draw into hands
+    hand_cards = []
+    drawn = iter(card_ids)
+    for player in players:
+      for slot, card_id in zip(free_slots[player.id], drawn):
+        hand_cards.append(HandCard(player=player, card_id=card_id, slot=slot))
+    HandCard.objects.bulk_create(hand_cards)
+    return update_fields
+
+  @staticmethod
+  def draw_api_cards(game, count):
+    """Deal white cards from one API fetch, topped up from the discard pile, as Card ids"""
+    # Fetch more cards than needed to account for duplicates
+    fetched = GameService.store_api_cards(cards_api.get_white_cards(count=count * 2), 'white')
+
+    # Stored API cards have one id per text, so only the fetched ids need checking for repeats
+    played = set(HandCard.objects.filter(player__game=game, card_id__in=fetched).values_list('card_id', flat=True))
+    played.update(SubmissionCard.objects.filter(
+      submission__round__game=game, card_id__in=fetched
+    ).values_list('card_id', flat=True))
+    card_ids = []
+    for card_id in fetched:
+      if card_id not in played and card_id not in card_ids and len(card_ids) < count:
+        card_ids.append(card_id)
+
+    if len(card_ids) < count:
+      # The API keeps repeating itself - reuse played cards rather than fetching again
+      in_play = GameService.cards_in_play(game)
+      spare = set(SubmissionCard.objects.filter(
+        submission__round__game=game, submission__round__status='completed'
+      ).values_list('card_id', flat=True)) | set(fetched)
+      spare = [card_id for card_id in spare if card_id not in in_play and card_id not in card_ids]
+      random.shuffle(spare)
+      card_ids += spare[:count - len(card_ids)]
+
+    return card_ids
+
+  @staticmethod
+  def store_api_cards(cards, card_type):
+    """Save API cards as inactive Card rows in the API pack and return their ids in order"""
+    if not cards:
+      return []
+    pack, _ = CardPack.objects.get_or_create(
+      name=GameService.API_PACK_NAME,
+      defaults={'description': 'Cards dealt from the API fallback', 'is_active': False}
+    )
+    texts = [card['text'] for card in cards]
+    Card.objects.bulk_create(
+      [Card(text=text, card_type=card_type, pack=pack, is_active=False) for text in texts],
+      ignore_conflicts=True
+    )
+    ids = dict(Card.objects.filter(pack=pack, card_type=card_type, text__in=texts).values_list('text', 'id'))
+    return [ids[text] for text in texts]
 
   @staticmethod
   @transaction.atomic
   def create_round(game):
     """Create a new round with a black card"""
+    # Lock the game so two requests can't both start the next round
+    locked = GameService.lock_game(game.pk)
+    last_round = locked.current_round
+    if last_round and last_round.status != 'completed':
+      if last_round.id != game.current_round_id:
+        # Another request already started the next round
+        game.current_round = last_round
+        game.current_round_number = last_round.round_number
+        return last_round
+      raise Exception("Current round is still in progress")
+
+    # Work on the locked row so deck cursors are current, then hand it back
+    round_obj = GameService._create_round(locked, last_round)
+    for field in ('white_deck', 'black_deck', 'white_deck_cursor', 'black_deck_cursor',
+                  'current_round', 'current_round_number'):
+      setattr(game, field, getattr(locked, field))
+    return round_obj
+
+  @staticmethod
+  def _create_round(game, last_round):
     # Get random black card
-    room = game.room
-    room_cards = GameService.get_room_cards(room, card_type='black')
-    
-    if room_cards:
-      # Use database cards - filter for single-pick cards only
-      available_black_cards = room_cards.filter(pick=1).order_by('?')
-      if not available_black_cards.exists():
-        raise Exception("No single-pick black cards available")
-      
-      # Get a random black card
-      db_card = available_black_cards.first()
+    if GameService.has_deck(game, 'black'):
+      # Use database cards
+      card_ids = GameService.draw_cards(game, 'black', 1)
+      if not card_ids:
+        # Every black card has been played - reshuffle and go again
+        random.shuffle(game.black_deck)
+        game.black_deck_cursor = 0
+        card_ids = GameService.draw_cards(game, 'black', 1)
+      cards = GameService.load_cards(card_ids)
+      if not cards:
+        raise Exception("No black cards available")
+      game.save(update_fields=['black_deck', 'black_deck_cursor'])
+
+      db_card = cards[0]
       black_card = {
         'text': db_card.text,
         'pick': db_card.pick,
@@ -170,7 +320,6 @@ class GameService:
       black_card = black_cards[0]  # Use the first one
 
     # Determine next judge (rotate through players)
-    last_round = game.rounds.order_by('-round_number').first()
     if last_round and last_round.judge:
       # Get next player after current judge
       players = list(game.players.order_by('id'))
@@ -195,12 +344,72 @@ class GameService:
       phase_start_time=timezone.now()
     )
 
+    # Point the game at its new round so endpoints don't have to look it up
+    game.current_round = round_obj
+    game.current_round_number = round_number
+    game.save(update_fields=['current_round', 'current_round_number'])
+
     return round_obj
 
+  @staticmethod
+  def advance_expired_round(round_id):
+    """Move a round on once its phase timer has run out.
+
+    The round row is locked and its deadline re-checked under the lock, so
+    however many callers race here (timer worker, browsers) each phase
+    advances exactly once. Returns True if the round advanced.
+    """
+    with transaction.atomic():
+      round_obj = Round.objects.select_for_update(of=('self',)).select_related('game__room').get(pk=round_id)
+      game = round_obj.game
+      if game.status != 'active' or game.current_round_id != round_obj.id:
+        return False
+
+      deadline = round_obj.phase_start_time + timedelta(seconds=game.room.turn_time_limit)
+      if timezone.now() < deadline:
+        return False
+
+      if round_obj.status == 'card_selection':
+        # Force advance to judging
+        round_obj.status = 'judging'
+        round_obj.phase_start_time = timezone.now()
+        round_obj.save(update_fields=['status', 'phase_start_time'])
+      elif round_obj.status == 'judging':
+        # Auto-select random winner or skip round
+        submissions = list(round_obj.submissions.all())
+        if submissions:
+          judge_player = game.players.get(user_id=round_obj.judge_id)
+          winner = random.choice(submissions)
+          if GameService.select_winner(round_obj, str(winner.id), judge_player):
+            # That was the last round
+            return True
+        else:
+          # Nobody played - close the round without a winner
+          round_obj.status = 'completed'
+          round_obj.ended_at = timezone.now()
+          round_obj.save(update_fields=['status', 'ended_at'])
+        GameService.create_round(game)
+      else:
+        return False
+
+    return True
+
   @staticmethod
   @transaction.atomic
-  def submit_card(player, round_obj, card_id):
-    """Submit a white card for the round"""
+  def submit_card(player, round_obj, card_ids):
+    """Submit white cards for the round, moving to judging once everyone has played.
+
+    card_ids are the hand's Card ids in the order they fill the black card's
+    blanks - exactly as many as it picks.
+    """
+    # Lock the round and make sure it's still taking cards
+    round_obj = GameService.lock_round(round_obj.pk, 'card_selection', "Cannot submit cards right now")
+
+    # Lock the game too - the replacement card comes off its shared deck
+    game = GameService.lock_game(round_obj.game_id, 'active', "Game is not in progress")
+    player = GamePlayer.objects.get(pk=player.pk)
+    player.game = game
+
     # Check if player already submitted
     if CardSubmission.objects.filter(
       round=round_obj,
@@ -208,33 +417,47 @@ class GameService:
     ).exists():
       raise Exception("Already submitted for this round")
 
-    # Find card in player's hand
-    card_hand = player.card_hand or []
-    selected_card = None
-
-    for card in card_hand:
-      if card['id'] == card_id:
-        selected_card = card
-        break
+    pick = round_obj.black_card.get('pick', 1)
+    if len(card_ids) != pick:
+      raise Exception(f"Pick {pick} card{'s' if pick != 1 else ''} for this round")
+    if not all(str(card_id).isdigit() for card_id in card_ids):
+      raise Exception("Card not found in hand")
+    card_ids = [int(card_id) for card_id in card_ids]
+    if len(set(card_ids)) != len(card_ids):
+      raise Exception("Each card can only be played once")
 
-    if not selected_card:
+    # Find every card in the player's hand at once
+    hand_cards = list(HandCard.objects.filter(player=player, card_id__in=card_ids))
+    if len(hand_cards) != len(card_ids):
       raise Exception("Card not found in hand")
 
     # Create submission
     submission = CardSubmission.objects.create(
       round=round_obj,
-      player=player,
-      white_cards=[selected_card]  # Support multiple cards for pick > 1
+      player=player
     )
+    SubmissionCard.objects.bulk_create([
+      SubmissionCard(submission=submission, card_id=card_id, position=position)
+      for position, card_id in enumerate(card_ids)
+    ])
+    Round.objects.filter(pk=round_obj.pk).update(submission_count=F('submission_count') + 1)
+    round_obj.refresh_from_db(fields=['submission_count'])
 
-    # Remove card from hand
-    card_hand = [c for c in card_hand if c['id'] != card_id]
-    player.card_hand = card_hand
-    player.save()
+    # Remove the cards from hand
+    HandCard.objects.filter(pk__in=[hand_card.pk for hand_card in hand_cards]).delete()
 
-    # Deal replacement card
+    # Deal every replacement in one draw
     GameService.deal_white_cards(player, count=10)
 
+    # Move to judging once every active non-judge player has submitted
+    expected_submissions = game.players.filter(is_active=True).exclude(
+      user_id=round_obj.judge_id
+    ).count()
+    if round_obj.submission_count >= expected_submissions:
+      round_obj.status = 'judging'
+      round_obj.phase_start_time = timezone.now()
+      round_obj.save(update_fields=['status', 'phase_start_time'])
+
     return submission
 
   @staticmethod
@@ -242,71 +465,158 @@ class GameService:
   def select_winner(round_obj, submission_id, judge_player):
     """Judge selects the winning submission"""
     # Verify judge (compare User objects)
-    if round_obj.judge.id != judge_player.user.id:
+    if round_obj.judge_id != judge_player.user_id:
       raise Exception("Only the judge can select winner")
 
+    # Lock the round and claim the judging phase - a second pick (or the timer) finds it completed
+    round_obj = GameService.lock_round(round_obj.pk, 'judging', "This round has already been judged")
+
     # Get submission
-    submission = CardSubmission.objects.get(
+    submission = CardSubmission.objects.select_related('player').get(
       id=submission_id,
       round=round_obj
     )
 
-    # Mark as winner
+    # Mark as winner and close the round
     round_obj.winning_submission = submission
-    round_obj.save()
+    round_obj.winner_id = submission.player.user_id
+    round_obj.status = 'completed'
+    round_obj.ended_at = timezone.now()
+    round_obj.save(update_fields=['winning_submission', 'winner', 'status', 'ended_at'])
+    submission.is_winner = True
+    submission.save(update_fields=['is_winner'])
 
     # Award point
-    submission.player.score += 1
-    submission.player.save()
-
-  # Check if we've reached the round limit
-    game = round_obj.game
-    if round_obj.round_number >= game.room.round_limit:
-      # Game is over - find player(s) with highest score
-      from django.db.models import Max
-      top_score = game.players.aggregate(Max('score'))['score__max']
-      top_players = game.players.filter(score=top_score)
-      if top_players.count() > 1:
-        # Multiple winners (tie) - leave winner as None to indicate tie
-        game.winner = None
-      else:
-        # Single winner
-        game.winner = top_players.first().user
-      game.status = 'ended'
-      game.save()
-      # Update user statistics
-      for player in game.players.all():
-        stats, created = UserStats.objects.get_or_create(user=player.user)
-        stats.games_played += 1
-        stats.total_score += player.score
-        if game.winner and player.user == game.winner:
-          stats.games_won += 1
-        stats.save()
-      return game
+    GamePlayer.objects.filter(pk=submission.player_id).update(score=F('score') + 1)
+
+    # Check if we've reached the round limit
+    if round_obj.round_number >= round_obj.game.room.round_limit:
+      game = GameService.lock_game(round_obj.game_id, 'active', "Game has already ended")
+      return GameService.finish_game(game)
     return None  # Continue to next round
 
   @staticmethod
+  @transaction.atomic
   def end_game_early(game):
     """End game before round limit - determine winner(s) by current highest score"""
-    from django.db.models import Max
-    top_score = game.players.aggregate(Max('score'))['score__max']
-    top_players = game.players.filter(score=top_score)
+    # Lock like the round transitions do - current round first, then the game - so
+    # ending the game while a card is being submitted waits instead of deadlocking
+    while True:
+      round_id = Game.objects.values_list('current_round_id', flat=True).get(pk=game.pk)
+      list(Round.objects.select_for_update().filter(pk=round_id))
+      # Only one ending can win - the round limit or another click finds it ended
+      game = GameService.lock_game(game.pk, 'active', "Game has already ended")
+      if game.current_round_id == round_id:
+        break
+      # A round started meanwhile - archive_game would take its lock out of order, so lock it first
+    return GameService.finish_game(game)
+
+  @staticmethod
+  def finish_game(game):
+    """Pick the winner (None on a tie), end the game and settle player stats.
 
-    if top_players.count() > 1:
-      # Multiple winners (tie)
+    Expects the game row to be locked by the caller.
+    """
+    top_scores = list(game.players.order_by('-score').values_list('user_id', 'score')[:2])
+    if len(top_scores) > 1 and top_scores[0][1] == top_scores[1][1]:
+      # Multiple winners (tie) - leave winner as None to indicate tie
       game.winner = None
     else:
-      # Single winner
-      game.winner = top_players.first().user
+      game.winner_id = top_scores[0][0] if top_scores else None
 
     game.status = 'ended'
-    game.save()
-    # Update user statistics
-    for player in game.players.all():
-      stats, created = UserStats.objects.get_or_create(user=player.user)
-      stats.games_played += 1
-      stats.total_score += player.score
-      if game.winner and player.user == game.winner:
-        stats.games_won += 1
-      stats.save()
-    return game
\ No newline at end of file
+    game.ended_at = timezone.now()
+    game.save(update_fields=['winner', 'status', 'ended_at'])
+    GameService.settle_stats(game)
+    leaderboards.record_game(game)
+    GameService.archive_game(game)
+    return game
+
+  @staticmethod
+  def settle_stats(game):
+    """Add a finished game to every player's UserStats in a fixed number of queries"""
+    user_ids = list(game.players.values_list('user_id', flat=True))
+    UserStats.objects.bulk_create(
+      [UserStats(user_id=user_id) for user_id in user_ids],
+      ignore_conflicts=True
+    )
+
+    # Increment in the database so two games ending at once can't lose an update
+    score = GamePlayer.objects.filter(game=game, user_id=OuterRef('user_id')).values('score')[:1]
+    UserStats.objects.filter(user_id__in=user_ids).update(
+      games_played=F('games_played') + 1,
+      games_won=Case(
+        When(user_id=game.winner_id, then=F('games_won') + 1),
+        default=F('games_won')
+      ),
+      total_score=F('total_score') + Subquery(score),
+      updated_at=timezone.now()
+    )
+
+  @staticmethod
+  @transaction.atomic
+  def archive_game(game):
+    """Compact a finished game into a GameHistory row and drop its round-by-round data.
+
+    Game and GamePlayer rows stay (the results page reads them); rounds,
+    submissions, hands and decks are removed from the hot tables.
+    """
+    players = list(game.players.values('id', 'user_id', 'user__username', 'score', 'turn_order'))
+    rounds = list(game.rounds.order_by('round_number').values(
+      'id', 'round_number', 'black_card', 'judge_id', 'winner_id', 'status'
+    ))
+    white_cards = {}
+    for submission_id, card_id, text in SubmissionCard.objects.filter(
+      submission__round__game=game
+    ).order_by('position').values_list('submission_id', 'card_id', 'card__text'):
+      white_cards.setdefault(submission_id, []).append({'id': card_id, 'text': text})
+    submissions = {}
+    for submission in CardSubmission.objects.filter(round__game=game).values(
+      'id', 'round_id', 'player_id', 'is_winner'
+    ):
+      submissions.setdefault(submission['round_id'], []).append({
+        'player_id': submission['player_id'],
+        'white_cards': white_cards.get(submission['id'], []),
+        'is_winner': submission['is_winner'],
+      })
+
+    data = {
+      'players': [{
+        'id': player['id'],
+        'user_id': player['user_id'],
+        'username': player['user__username'],
+        'score': player['score'],
+        'turn_order': player['turn_order'],
+      } for player in players],
+      'rounds': [{
+        'round_number': round_data['round_number'],
+        'black_card': round_data['black_card'],
+        'judge_id': round_data['judge_id'],
+        'winner_id': round_data['winner_id'],
+        'status': round_data['status'],
+        'submissions': submissions.get(round_data['id'], []),
+      } for round_data in rounds],
+    }
+    history = GameHistory.objects.create(
+      game=game,
+      room_code=game.room.room_code,
+      room_name=game.room.name,
+      winner_id=game.winner_id,
+      player_count=len(players),
+      round_count=len(rounds),
+      started_at=game.started_at,
+      ended_at=game.ended_at,
+      data=GameHistory.pack(data),
+    )
+
+    # Break the links back into the rows being removed, then remove them
+    game.current_round = None
+    game.white_deck = []
+    game.black_deck = []
+    game.dealt_white_cards = b''
+    game.save(update_fields=['current_round', 'white_deck', 'black_deck', 'dealt_white_cards'])
+    Round.objects.filter(game=game).update(winning_submission=None)
+    CardSubmission.objects.filter(round__game=game).delete()
+    Round.objects.filter(game=game).delete()
+    HandCard.objects.filter(player__game=game).delete()
+    return history
@@ -0,0 +1,44 @@
+// Live room updates over a WebSocket, falling back to polling while the
+// socket is unavailable (e.g. when the site is served over plain WSGI).
+function watchRoom(roomCode, onUpdate, pollInterval) {
+    let pollTimer = null;
+    let retryDelay = 1000;
+
+    function startPolling() {
+        if (!pollTimer) {
+            pollTimer = setInterval(onUpdate, pollInterval);
+        }
+    }
+
+    function stopPolling() {
+        if (pollTimer) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    }
+
+    function connect() {
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.host}/ws/room/${roomCode}/`);
+
+        socket.onopen = () => {
+            retryDelay = 1000;
+            stopPolling();
+            // Catch up on anything that changed while we were connecting
+            onUpdate();
+        };
+
+        socket.onmessage = () => onUpdate();
+
+        socket.onclose = () => {
+            startPolling();
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    }
+
+    startPolling();
+    if ('WebSocket' in window) {
+        connect();
+    }
+}
@@ -1,8 +1,73 @@
-from django.test import TestCase
-from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from unittest import skipUnless
+import csv
+import requests
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+from django.urls import reverse
+from django.db import DatabaseError, connection, connections
+from django.test.utils import CaptureQueriesContext
 from unittest.mock import patch, MagicMock
-from .models import Room, Game, GamePlayer
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from .models import User, Room, Game, GamePlayer, HandCard, Card, CardPack, CardPool, RoomMembership, Round, UserStats, CardSubmission, SubmissionCard, GameHistory
 from .services import GameService
+from . import card_pools, leaderboards
+from .consumers import room_socket
+from .realtime import publish_room_update
+from .management.commands.run_round_timer import Command as RoundTimerCommand
+from .views import invalidate_game_status_cache
+from .read_models import load_game_screen
+from .utils.tiered_cache import TieredCache
+from .utils.json_stream import iter_array
+from .utils.bitset import Bitset
+from .utils.card_import import pick_from_text, source_pick
+from .utils.api_client import CardsAPIClient, AsyncCardsAPIClient
+from django.core.cache import cache
+
+
+def hand_picks(player, round_obj):
+  """The first cards in a player's hand, as many as the round's black card picks, as the submit form posts them"""
+  pick = round_obj.black_card.get('pick', 1)
+  return [str(card_id) for card_id in player.hand_cards.values_list('card_id', flat=True)[:pick]]
+
+
+class TwoPlayerGameMixin:
+  """A host and a player, a pack of 30 white and 5 black cards, and started games between them"""
+
+  def create_players_and_pack(self, name):
+    self.host = User.objects.create_user('host', 'host@test.com', 'password')
+    self.player = User.objects.create_user('player1', 'p1@test.com', 'password')
+    self.pack = CardPack.objects.create(name=f'{name} Pack')
+    Card.objects.bulk_create(
+      [Card(text=f'White {i}', card_type='white', pack=self.pack) for i in range(30)] +
+      [Card(text=f'Black {i} _', card_type='black', pack=self.pack) for i in range(5)]
+    )
+
+  def start_two_player_game(self, room_name, **room_fields):
+    """Start a game between the host and the player in a new room playing the pack; returns its first round"""
+    room = Room.objects.create(name=room_name, creator=self.host, **room_fields)
+    room.selected_packs.set([self.pack])
+    game = Game.objects.create(room=room)
+    GamePlayer.objects.create(game=game, user=self.host, turn_order=1)
+    GamePlayer.objects.create(game=game, user=self.player, turn_order=2)
+    return GameService.start_game(game)
+
+  def set_up_started_game(self, name, **room_fields):
+    """Everything above for one game, kept on self.room, self.game and self.round"""
+    self.create_players_and_pack(name)
+    self.round = self.start_two_player_game(f'{name} Room', **room_fields)
+    self.game = self.round.game
+    self.room = self.game.room
 
 
 class CardDeduplicationTestCase(TestCase):
@@ -16,8 +81,8 @@ class CardDeduplicationTestCase(TestCase):
     # Create room and game
     self.room = Room.objects.create(
       name='Test Room',
-      room_code='TEST123',
-      host=self.host,
+      room_code='TEST12',
+      creator=self.host,
       max_players=6
     )
     self.game = Game.objects.create(
@@ -59,14 +124,1148 @@ class CardDeduplicationTestCase(TestCase):
     self.game.refresh_from_db()
     
     # Get all card texts
-    player1_cards = set(card['text'] for card in self.game_player1.card_hand)
-    player2_cards = set(card['text'] for card in self.game_player2.card_hand)
+    player1_cards = set(self.game_player1.hand_cards.values_list('card__text', flat=True))
+    player2_cards = set(self.game_player2.hand_cards.values_list('card__text', flat=True))
+    self.assertEqual(len(player1_cards), 10)
     
     # Assert no duplicates
     duplicates = player1_cards & player2_cards
     self.assertEqual(len(duplicates), 0, f"Found duplicate cards: {duplicates}")
     
-    # Assert all dealt cards are tracked
-    all_dealt = set(self.game.dealt_white_cards)
-    expected_dealt = player1_cards | player2_cards
-    self.assertEqual(all_dealt, expected_dealt)
\ No newline at end of file
+    # Assert all dealt cards are tracked - API cards by their hand rows, not the game row
+    all_dealt = set(HandCard.objects.filter(player__game=self.game).values_list('card__text', flat=True))
+    self.assertEqual(all_dealt, player1_cards | player2_cards)
+    self.assertEqual(bytes(self.game.dealt_white_cards), b'')
+
+
+class BitsetTestCase(TestCase):
+  def test_round_trips_through_bytes(self):
+    bitset = Bitset([0, 3, 64, 1000])
+    bitset.discard(3)
+    restored = Bitset.from_bytes(memoryview(bitset.to_bytes()))
+    self.assertEqual(list(restored), [0, 64, 1000])
+    self.assertEqual(len(restored), 3)
+    self.assertIn(1000, restored)
+    self.assertNotIn(3, restored)
+    self.assertEqual(len(bitset.to_bytes()), 126)
+    self.assertEqual(Bitset.from_bytes(b''), Bitset())
+
+
+class DeckDealingTestCase(TestCase):
+  def setUp(self):
+    """Set up a room with a small database card pool"""
+    self.host = User.objects.create_user('host', 'host@test.com', 'password')
+    self.player1 = User.objects.create_user('player1', 'p1@test.com', 'password')
+    self.player2 = User.objects.create_user('player2', 'p2@test.com', 'password')
+
+    self.pack = CardPack.objects.create(name='Test Pack')
+    Card.objects.bulk_create(
+      [Card(text=f'White {i}', card_type='white', pack=self.pack) for i in range(30)] +
+      [Card(text=f'Black {i} _', card_type='black', pack=self.pack) for i in range(3)] +
+      [Card(text=f'Pick two {i} _ _', card_type='black', pick=2, pack=self.pack) for i in range(3)]
+    )
+
+    self.room = Room.objects.create(name='Deck Room', creator=self.host)
+    self.room.selected_packs.set([self.pack])
+    card_pools.assign_room_pool(self.room)
+    self.game = Game.objects.create(room=self.room)
+    GamePlayer.objects.create(game=self.game, user=self.player1, turn_order=1)
+    GamePlayer.objects.create(game=self.game, user=self.player2, turn_order=2)
+
+  def test_build_decks_shuffles_room_pool(self):
+    """Decks hold every white and black card, multi-pick ones included"""
+    self.assertTrue(GameService.build_decks(self.game))
+    self.game.refresh_from_db()
+
+    white_ids = set(Card.objects.filter(card_type='white').values_list('id', flat=True))
+    black_ids = set(Card.objects.filter(card_type='black').values_list('id', flat=True))
+    self.assertEqual(set(self.game.white_deck), white_ids)
+    self.assertEqual(set(self.game.black_deck), black_ids)
+    self.assertEqual(self.game.white_deck_cursor, 0)
+
+  def test_dealing_draws_from_deck_without_repeats(self):
+    """Dealing pops unique cards off the deck and advances the cursor"""
+    GameService.start_game(self.game)
+    self.game.refresh_from_db()
+
+    dealt_ids = list(HandCard.objects.order_by('player__turn_order', 'slot').values_list('card_id', flat=True))
+    self.assertEqual(len(dealt_ids), 20)
+    self.assertEqual(len(set(dealt_ids)), 20)
+    self.assertEqual(self.game.white_deck_cursor, 20)
+    self.assertEqual(dealt_ids, self.game.white_deck[:20])
+
+  def test_dealt_cards_are_tracked_as_bits_over_the_deck(self):
+    """Dealing sets one bit per deck position; the game row holds a few bytes, not card texts"""
+    GameService.start_game(self.game)
+    self.game.refresh_from_db()
+
+    dealt = Bitset.from_bytes(self.game.dealt_white_cards)
+    hand_ids = set(HandCard.objects.values_list('card_id', flat=True))
+    self.assertEqual({self.game.white_deck[position] for position in dealt}, hand_ids)
+    self.assertLessEqual(len(bytes(self.game.dealt_white_cards)), 4)
+    self.assertEqual(GameService.white_cards_left(self.game), 10)
+
+  def test_discards_are_reshuffled_into_a_short_draw_pile(self):
+    """Hands keep filling long after the pool would have run dry, without doubling up cards"""
+    GameService.start_game(self.game)
+    player1, player2 = self.game.players.all()
+    for _ in range(6):
+      # Player 1 plays out their whole hand; it goes to the discard pile
+      player1.hand_cards.all().delete()
+      GameService.deal_white_cards(player1, count=10)
+
+      game = Game.objects.get(pk=self.game.pk)
+      hand1 = set(player1.hand_cards.values_list('card_id', flat=True))
+      hand2 = set(player2.hand_cards.values_list('card_id', flat=True))
+      self.assertEqual(len(hand1), 10)
+      self.assertFalse(hand1 & hand2)
+      self.assertEqual(GameService.white_cards_left(game), len(game.white_deck) - game.white_deck_cursor)
+
+      # The deck keeps every card, so the dealt bits still name the cards in hands
+      dealt = Bitset.from_bytes(game.dealt_white_cards)
+      self.assertEqual(len(game.white_deck), 30)
+      self.assertTrue(hand1 | hand2 <= {game.white_deck[position] for position in dealt})
+
+  @patch('main_app.services.cards_api.get_white_cards')
+  def test_api_fallback_recycles_discards_after_one_fetch(self, mock_get_cards):
+    """A repeating API costs one fetch per deal; the discard pile makes up the difference"""
+    Card.objects.all().delete()
+    card_pools.invalidate_pools()
+    mock_get_cards.return_value = [{'text': f'Card {i}', 'pack': 'Test Pack'} for i in range(10)]
+    player = self.game.players.first()
+    GameService.deal_white_cards(player, count=10)
+    first_hand = set(player.hand_cards.values_list('card_id', flat=True))
+
+    player.hand_cards.all().delete()
+    GameService.deal_white_cards(player, count=10)
+    self.assertEqual(set(player.hand_cards.values_list('card_id', flat=True)), first_hand)
+    self.assertEqual(mock_get_cards.call_count, 2)
+
+  @patch('main_app.services.cards_api.get_black_cards')
+  @patch('main_app.services.cards_api.get_white_cards')
+  def test_each_color_falls_back_to_the_api_on_its_own(self, mock_get_white, mock_get_black):
+    """Packs with only white cards deal white from the deck and black from the API, and vice versa"""
+    mock_get_white.return_value = [{'text': f'API white {i}', 'pack': 'API'} for i in range(40)]
+    mock_get_black.return_value = [{'text': 'API black _', 'pick': 1, 'pack': 'API'}]
+    Card.objects.filter(card_type='black').delete()
+    card_pools.invalidate_pools()
+
+    round_obj = GameService.start_game(self.game)
+    self.assertEqual(round_obj.black_card['text'], 'API black _')
+    self.assertFalse(HandCard.objects.exclude(card__pack=self.pack).exists())
+    mock_get_white.assert_not_called()
+
+    other_pack = CardPack.objects.create(name='Black Only')
+    Card.objects.create(text='Deck black _', card_type='black', pack=other_pack)
+    room = Room.objects.create(name='Black Room', creator=self.host)
+    room.selected_packs.set([other_pack])
+    game = Game.objects.create(room=room)
+    GamePlayer.objects.create(game=game, user=self.player1, turn_order=1)
+    GamePlayer.objects.create(game=game, user=self.player2, turn_order=2)
+
+    round_obj = GameService.start_game(game)
+    self.assertEqual(round_obj.black_card['text'], 'Deck black _')
+    self.assertEqual(HandCard.objects.filter(player__game=game, card__pack__name=GameService.API_PACK_NAME).count(), 20)
+
+  def test_black_deck_reshuffles_when_exhausted(self):
+    """Rounds keep getting black cards after the black deck runs out"""
+    GameService.build_decks(self.game)
+    black_texts = {f'Black {i} _' for i in range(3)} | {f'Pick two {i} _ _' for i in range(3)}
+    for _ in range(8):
+      round_obj = GameService.create_round(self.game)
+      Round.objects.filter(pk=round_obj.pk).update(status='completed')
+      self.assertIn(round_obj.black_card['text'], black_texts)
+
+  def test_multi_pick_rounds_take_ordered_cards_in_one_submission(self):
+    """A pick-two round takes both cards at once, keeps their order and refills the hand in one draw"""
+    round_obj = GameService.start_game(self.game)
+    pick_two = Card.objects.filter(pick=2).first()
+    Round.objects.filter(pk=round_obj.pk).update(black_card={'text': pick_two.text, 'pick': 2, 'pack': 'Test Pack'})
+    round_obj.refresh_from_db()
+    player = self.game.players.exclude(user=round_obj.judge).get()
+    second, first = player.hand_cards.values_list('card_id', flat=True)[:2]
+
+    with self.assertRaises(Exception):
+      GameService.submit_card(player, round_obj, [str(first)])
+    with self.assertRaises(Exception):
+      GameService.submit_card(player, round_obj, [str(first), str(first)])
+    with self.assertRaises(Exception):
+      GameService.submit_card(player, round_obj, [str(first), str(Card.objects.filter(card_type='black').first().id)])
+    self.assertFalse(round_obj.submissions.exists())
+
+    submission = GameService.submit_card(player, round_obj, [str(first), str(second)])
+    self.assertEqual(list(submission.cards.values_list('card_id', flat=True)), [first, second])
+    self.assertEqual(player.hand_cards.count(), 10)
+    self.assertFalse(player.hand_cards.filter(card_id__in=[first, second]).exists())
+
+  def test_start_game_query_count_is_flat(self):
+    """Opening hands cost the same number of queries for any table size"""
+    # Enough cards for eight hands, so neither deal has to reshuffle
+    Card.objects.bulk_create([Card(text=f'Extra white {i}', card_type='white', pack=self.pack) for i in range(60)])
+    card_pools.invalidate_pools([self.pack.id])
+    card_pools.assign_room_pool(self.room)
+    game = Game.objects.get(pk=self.game.pk)
+    with CaptureQueriesContext(connection) as two_players:
+      GameService.start_game(game)
+
+    for i in range(3, 9):
+      user = User.objects.create_user(f'player{i}', f'p{i}@test.com', 'password')
+      GamePlayer.objects.create(game=self.game, user=user, turn_order=i)
+    self.game.rounds.all().delete()
+    HandCard.objects.all().delete()
+    Game.objects.filter(pk=self.game.pk).update(status='waiting')
+
+    game = Game.objects.get(pk=self.game.pk)
+    with CaptureQueriesContext(connection) as eight_players:
+      GameService.start_game(game)
+
+    self.assertEqual(len(eight_players), len(two_players))
+    hand_sizes = [player.hand_cards.count() for player in self.game.players.all()]
+    self.assertEqual(hand_sizes, [10] * 8)
+
+
+class RoomSocketTestCase(TestCase):
+  def setUp(self):
+    self.host = User.objects.create_user('host', 'host@test.com', 'password')
+    self.room = Room.objects.create(name='Socket Room', creator=self.host)
+    RoomMembership.objects.create(user=self.host, room=self.room)
+
+  def socket_for(self, cookie=None):
+    headers = [(b'cookie', cookie.encode())] if cookie else []
+    scope = {'type': 'websocket', 'path': f'/ws/room/{self.room.room_code}/', 'headers': headers}
+
+    async def application(scope, receive, send):
+      await room_socket(scope, receive, send, self.room.room_code)
+
+    return ApplicationCommunicator(application, scope)
+
+  def test_member_receives_room_updates(self):
+    """A logged-in member's socket is accepted and gets published updates"""
+    self.client.force_login(self.host)
+    cookie = f"sessionid={self.client.cookies['sessionid'].value}"
+
+    async def scenario():
+      socket = self.socket_for(cookie)
+      await socket.send_input({'type': 'websocket.connect'})
+      self.assertEqual((await socket.receive_output(timeout=5))['type'], 'websocket.accept')
+      # Give the forwarder a moment to subscribe before publishing
+      await socket.receive_nothing(timeout=0.1)
+      publish_room_update(self.room.room_code)
+      message = await socket.receive_output(timeout=5)
+      await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+      await socket.wait(timeout=5)
+      return message
+
+    message = async_to_sync(scenario)()
+    self.assertEqual(message['type'], 'websocket.send')
+    self.assertIn('room.updated', message['text'])
+
+  def test_anonymous_socket_is_rejected(self):
+    """Sockets without a member session are closed before accepting"""
+    async def scenario():
+      socket = self.socket_for()
+      await socket.send_input({'type': 'websocket.connect'})
+      return await socket.receive_output(timeout=5)
+
+    self.assertEqual(async_to_sync(scenario)()['type'], 'websocket.close')
+
+
+class RoomStateETagTestCase(TestCase):
+  def setUp(self):
+    self.host = User.objects.create_user('host', 'host@test.com', 'password')
+    self.room = Room.objects.create(name='ETag Room', creator=self.host)
+    RoomMembership.objects.create(user=self.host, room=self.room)
+    self.client.force_login(self.host)
+
+  def test_polling_endpoints_return_304_until_room_changes(self):
+    """Unchanged rooms answer If-None-Match with 304; a change issues a new ETag"""
+    for name in ('lobby_status', 'game_status'):
+      url = reverse(name, args=[self.room.room_code])
+      response = self.client.get(url)
+      self.assertEqual(response.status_code, 200)
+      etag = response['ETag']
+
+      response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+      self.assertEqual(response.status_code, 304)
+
+      invalidate_game_status_cache(self.room.room_code)
+      response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+      self.assertEqual(response.status_code, 200)
+      self.assertNotEqual(response['ETag'], etag)
+
+  def test_game_status_body_belongs_to_its_etag(self):
+    """A body cached late for the old version is never served under the new ETag"""
+    url = reverse('game_status', args=[self.room.room_code])
+    stale = self.client.get(url).json()
+    Game.objects.create(room=self.room)
+    invalidate_game_status_cache(self.room.room_code)
+    # A request that read the old state finishes caching it after the change
+    cache.set(f'game_status_{self.room.room_code}_0', stale)
+
+    response = self.client.get(url)
+    self.assertEqual(response['ETag'], f'"{self.room.room_code}-1"')
+    self.assertEqual(response.json()['game_status'], 'waiting')
+
+  def test_leaving_members_change_the_lobby_etag(self):
+    """Deleting an account drops the player from lobbies that were answering 304"""
+    player = User.objects.create_user('player1', 'p1@test.com', 'password')
+    RoomMembership.objects.create(user=player, room=self.room)
+    url = reverse('lobby_status', args=[self.room.room_code])
+    response = self.client.get(url)
+    self.assertEqual(response.json()['player_count'], 2)
+
+    self.client.force_login(player)
+    self.client.post(reverse('delete_account'), {'password': 'password'})
+    self.client.force_login(self.host)
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['player_count'], 1)
+
+  def test_broker_outage_does_not_fail_committed_changes(self):
+    """A publish error is logged; the state version still moves so polling clients catch up"""
+    url = reverse('lobby_status', args=[self.room.room_code])
+    etag = self.client.get(url)['ETag']
+    broker = MagicMock()
+    broker.publish.side_effect = ConnectionError('broker down')
+
+    with patch('main_app.realtime.get_broker', return_value=broker), self.assertLogs('main_app.realtime', 'ERROR'):
+      invalidate_game_status_cache(self.room.room_code)
+    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TieredCacheTestCase(TestCase):
+  def make_process_cache(self):
+    """Each instance plays one worker process sharing the same shared tier"""
+    return TieredCache('tiered-test-shared', {
+      'OPTIONS': {
+        'SHARED_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'SYNC_INTERVAL': 0,
+      }
+    })
+
+  def setUp(self):
+    self.worker_a = self.make_process_cache()
+    self.worker_b = self.make_process_cache()
+    self.worker_a.clear()
+
+  def test_reads_are_served_locally_after_first_fetch(self):
+    """The second read of a key never reaches the shared tier"""
+    self.worker_a.set('pool', [1, 2, 3])
+    self.assertEqual(self.worker_b.get('pool'), [1, 2, 3])
+    self.assertEqual(self.worker_b.get('pool'), [1, 2, 3])
+    self.assertIsNone(self.worker_b.get('missing'))
+
+    stats = self.worker_b.stats()
+    self.assertEqual(stats['shared_hits'], 1)
+    self.assertEqual(stats['local_hits'], 1)
+    self.assertEqual(stats['misses'], 1)
+
+  def test_writes_invalidate_other_processes(self):
+    """A set or delete in one process evicts the stale local copy in another"""
+    self.worker_a.set('status', 'waiting')
+    self.assertEqual(self.worker_b.get('status'), 'waiting')
+
+    self.worker_a.set('status', 'active')
+    self.assertEqual(self.worker_b.get('status'), 'active')
+
+    self.worker_a.delete('status')
+    self.assertIsNone(self.worker_b.get('status'))
+
+  def test_local_copies_expire_with_their_shared_entry(self):
+    """A key set for less than LOCAL_TIMEOUT is not served locally after it expired in the shared tier"""
+    self.worker_a.set('short', 'fresh', timeout=1)
+    self.worker_a.set('long', 'kept', timeout=60)
+    self.assertEqual(self.worker_b.get_many(['short', 'long']), {'short': 'fresh', 'long': 'kept'})
+    self.assertTrue(self.worker_a.touch('long', timeout=1))
+    self.assertEqual(self.worker_b.get('short'), 'fresh')
+
+    time.sleep(1.1)
+    self.assertIsNone(self.worker_b.get('short'))
+    self.assertIsNone(self.worker_a.get('short'))
+    self.assertIsNone(self.worker_b.get('long'))
+
+
+class FileTieredCacheTestCase(TestCase):
+  """The configured default: a file cache as the shared tier"""
+
+  def make_process_cache(self):
+    return TieredCache(self.location, {'OPTIONS': {'SYNC_INTERVAL': 0}})
+
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.location = directory.name
+
+  def test_invalidation_log_does_not_cull_entries(self):
+    """Hundreds of writes keep every entry; the log alone used to overflow MAX_ENTRIES=300"""
+    worker = self.make_process_cache()
+    worker.set('pool', [1, 2, 3], timeout=None)
+    for i in range(400):
+      worker.set(f'key{i}', i)
+    reader = self.make_process_cache()
+    self.assertEqual(reader.get('pool'), [1, 2, 3])
+    self.assertEqual(len(reader.get_many([f'key{i}' for i in range(400)])), 400)
+
+  def test_concurrent_writers_claim_distinct_sequence_numbers(self):
+    """Every write gets its own log slot, so no invalidation is lost"""
+    workers = [self.make_process_cache() for _ in range(4)]
+
+    def write(worker, index):
+      for i in range(25):
+        worker.set(f'w{index}-{i}', i)
+
+    threads = [threading.Thread(target=write, args=(worker, index)) for index, worker in enumerate(workers)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(workers[0].shared.get('tiered_cache_sequence'), 100)
+
+
+class PackPoolTestCase(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.client_api = CardsAPIClient()
+    self.api_cards = {
+      'white': [{'text': f'{pack} white {i}', 'pack': pack} for pack in ('Pack A', 'Pack B') for i in range(100)],
+      'black': [{'text': f'Question {i}', 'pick': 1 + i % 2, 'pack': 'Pack A'} for i in range(10)],
+    }
+
+  def test_samples_union_of_pack_pools(self):
+    """Pools are built once per pack and sampled across every selected pack"""
+    with patch.object(self.client_api, 'get_cards', return_value=self.api_cards) as get_cards:
+      white = self.client_api.get_white_cards(count=150, packs=['Pack A', 'Pack B'])
+      black = self.client_api.get_black_cards(count=10, packs=['Pack A', 'Pack B'])
+
+    self.assertEqual(get_cards.call_count, 1)
+    self.assertEqual(len(white), 150)
+    self.assertEqual(len(set(card['text'] for card in white)), 150)
+    self.assertEqual({card['pack'] for card in white}, {'Pack A', 'Pack B'})
+    # Every question is in the black pool, carrying its pick
+    self.assertEqual(len(black), 10)
+    self.assertEqual({card['text']: card['pick'] for card in black}, {f'Question {i}': 1 + i % 2 for i in range(10)})
+
+  def test_failed_fetch_is_not_cached_as_empty_pools(self):
+    """While the API is down draws use the fallback cards, and the packs are fetched again once it's back"""
+    response = MagicMock()
+    response.json.return_value = self.api_cards
+    with patch.object(self.client_api.session, 'get', side_effect=requests.ConnectionError):
+      black = self.client_api.get_black_cards(count=1, packs=['Pack A', 'Pack B'])
+    self.assertEqual(black[0]['pack'], 'Fallback Pack')
+
+    with patch.object(self.client_api.session, 'get', return_value=response) as get:
+      white = self.client_api.get_white_cards(count=5, packs=['Pack A', 'Pack B'])
+    self.assertEqual(get.call_count, 1)
+    self.assertEqual(len(white), 5)
+    self.assertTrue(all(card['pack'] in ('Pack A', 'Pack B') for card in white))
+
+
+class GameScreenQueryTestCase(TestCase):
+  def setUp(self):
+    self.host = User.objects.create_user('host', 'host@test.com', 'password')
+    pack = CardPack.objects.create(name='Screen Pack')
+    Card.objects.bulk_create(
+      [Card(text=f'White {i}', card_type='white', pack=pack) for i in range(100)] +
+      [Card(text=f'Black {i} _', card_type='black', pack=pack) for i in range(5)]
+    )
+    self.room = Room.objects.create(name='Screen Room', creator=self.host)
+    self.room.selected_packs.set([pack])
+    self.game = Game.objects.create(room=self.room)
+    self.add_players(1, 2)
+    self.round = GameService.start_game(self.game)
+
+  def add_players(self, first, last):
+    for i in range(first, last + 1):
+      user = self.host if i == 1 else User.objects.create_user(f'player{i}', f'p{i}@test.com', 'password')
+      RoomMembership.objects.get_or_create(user=user, room=self.room)
+      GamePlayer.objects.get_or_create(game=self.game, user=user, defaults={'turn_order': i})
+
+  def submit_all(self):
+    for player in self.game.players.exclude(user=self.round.judge):
+      if not self.round.submissions.filter(player=player).exists():
+        GameService.submit_card(player, self.round, hand_picks(player, self.round))
+
+  def render_queries(self):
+    self.client.force_login(self.host)
+    url = reverse('game_play', args=[self.room.room_code])
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(url)
+    self.assertEqual(response.status_code, 200)
+    return len(queries)
+
+  def test_loader_uses_fixed_queries(self):
+    """Room+game+round, players, hand, submissions and their cards: five queries"""
+    self.submit_all()
+    with self.assertNumQueries(5):
+      load_game_screen(self.room.room_code, self.host)
+
+  def test_game_page_query_count_does_not_grow_with_players(self):
+    """Rendering the game page costs the same with 2 or 8 players"""
+    self.submit_all()
+    small_table = self.render_queries()
+
+    self.add_players(3, 8)
+    GameService.deal_opening_hands(self.game, list(self.game.players.all()))
+    # The lone submission above already closed card selection; reopen it for the new players
+    Round.objects.filter(pk=self.round.pk).update(status='card_selection')
+    self.submit_all()
+    self.assertEqual(self.render_queries(), small_table)
+
+  def test_round_counters_follow_submissions(self):
+    """The game points at its latest round, which counts its own submissions"""
+    self.game.refresh_from_db()
+    self.assertEqual(self.game.current_round_id, self.round.id)
+    self.assertEqual(self.game.current_round_number, 1)
+
+    self.submit_all()
+    self.round.refresh_from_db()
+    self.assertEqual(self.round.submission_count, self.round.submissions.count())
+
+
+class RoundTimerTestCase(TwoPlayerGameMixin, TestCase):
+  def setUp(self):
+    self.set_up_started_game('Timer', turn_time_limit=60)
+
+  def expire(self):
+    Round.objects.filter(pk=self.round.pk).update(phase_start_time=timezone.now() - timedelta(seconds=61))
+
+  def test_expired_phase_advances_exactly_once(self):
+    """Repeated calls after the deadline only move the round on once"""
+    self.assertFalse(GameService.advance_expired_round(self.round.id))
+
+    self.expire()
+    self.assertTrue(GameService.advance_expired_round(self.round.id))
+    self.assertFalse(GameService.advance_expired_round(self.round.id))
+    self.round.refresh_from_db()
+    self.assertEqual(self.round.status, 'judging')
+
+  def test_worker_skips_empty_judging_to_next_round(self):
+    """The timer command starts a new round when nobody submitted"""
+    Round.objects.filter(pk=self.round.pk).update(status='judging')
+    self.expire()
+    call_command('run_round_timer', once=True, stdout=StringIO())
+
+    self.game.refresh_from_db()
+    self.assertEqual(self.game.current_round_number, 2)
+    call_command('run_round_timer', once=True, stdout=StringIO())
+    self.game.refresh_from_db()
+    self.assertEqual(self.game.current_round_number, 2)
+
+  def test_worker_watches_the_next_deadline_right_after_advancing(self):
+    """An advanced round's new phase deadline goes straight onto the heap"""
+    self.expire()
+    command = RoundTimerCommand(stdout=StringIO())
+    deadlines = command.load_deadlines()
+    command.fire_due(deadlines)
+
+    self.round.refresh_from_db()
+    self.assertEqual(self.round.status, 'judging')
+    self.assertEqual(deadlines, [(self.round.phase_start_time + timedelta(seconds=60), self.round.id, self.room.room_code)])
+
+  @override_settings(ROUND_TIMER_WORKER=False)
+  def test_timer_check_can_end_the_game(self):
+    """Auto-judging the last round archives it; the timer endpoint reports the game ended"""
+    Room.objects.filter(pk=self.room.pk).update(round_limit=1)
+    player = self.game.players.exclude(user=self.round.judge).get()
+    GameService.submit_card(player, self.round, hand_picks(player, self.round))
+    self.expire()
+
+    self.client.force_login(self.host)
+    response = self.client.get(reverse('check_timer', args=[self.room.room_code]))
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['current_phase'], 'ended')
+    self.game.refresh_from_db()
+    self.assertEqual(self.game.status, 'ended')
+    self.assertFalse(Round.objects.filter(game=self.game).exists())
+
+
+class PhaseTransitionTestCase(TwoPlayerGameMixin, TestCase):
+  def setUp(self):
+    self.set_up_started_game('Phase')
+
+  def test_repeated_transitions_are_rejected(self):
+    """A second start, submit or winner pick finds the phase already moved on"""
+    with self.assertRaises(Exception):
+      GameService.start_game(Game.objects.get(pk=self.game.pk))
+
+    player = self.game.players.exclude(user=self.round.judge).get()
+    card_ids = hand_picks(player, self.round)
+    submission = GameService.submit_card(player, self.round, card_ids)
+    self.round.refresh_from_db()
+    self.assertEqual(self.round.status, 'judging')
+    with self.assertRaises(Exception):
+      GameService.submit_card(player, self.round, hand_picks(player, self.round))
+
+    judge = self.game.players.get(user=self.round.judge)
+    GameService.select_winner(self.round, str(submission.id), judge)
+    with self.assertRaises(Exception):
+      GameService.select_winner(self.round, str(submission.id), judge)
+
+    player.refresh_from_db()
+    self.assertEqual(player.score, 1)
+
+    # Only the first request to start the next round creates one
+    GameService.create_round(Game.objects.get(pk=self.game.pk))
+    GameService.create_round(self.game)
+    self.assertEqual(self.game.rounds.count(), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Row locks need PostgreSQL')
+class ConcurrentTransitionTestCase(TwoPlayerGameMixin, TransactionTestCase):
+  def setUp(self):
+    self.set_up_started_game('Race')
+
+  def race(self, action, threads=8):
+    """Run the same action from several threads at once and count the winners"""
+    barrier = threading.Barrier(threads)
+    successes = []
+
+    def worker():
+      try:
+        barrier.wait()
+        action()
+        successes.append(True)
+      except Exception:
+        pass
+      finally:
+        connections.close_all()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+      thread.start()
+    for thread in workers:
+      thread.join()
+    return len(successes)
+
+  def test_racing_requests_apply_each_transition_once(self):
+    """Duplicate submits, winner picks and next-round requests only land once"""
+    player = self.game.players.exclude(user=self.round.judge).get()
+    card_ids = hand_picks(player, self.round)
+    self.assertEqual(self.race(lambda: GameService.submit_card(player, self.round, card_ids)), 1)
+
+    submission = self.round.submissions.get()
+    judge = self.game.players.get(user=self.round.judge)
+    self.assertEqual(self.race(lambda: GameService.select_winner(self.round, str(submission.id), judge)), 1)
+    player.refresh_from_db()
+    self.assertEqual(player.score, 1)
+
+    self.race(lambda: GameService.create_round(Game.objects.get(pk=self.game.pk)))
+    self.assertEqual(self.game.rounds.count(), 2)
+
+  def test_ending_the_game_during_a_submit_does_not_deadlock(self):
+    """Ending the game and submitting lock in the same order, so neither request errors out"""
+    player = self.game.players.exclude(user=self.round.judge).get()
+    card_ids = hand_picks(player, self.round)
+    barrier = threading.Barrier(2)
+    database_errors = []
+
+    def worker(action):
+      try:
+        barrier.wait()
+        action()
+      except DatabaseError as error:
+        database_errors.append(error)
+      except Exception:
+        pass
+      finally:
+        connections.close_all()
+
+    workers = [
+      threading.Thread(target=worker, args=(lambda: GameService.submit_card(player, self.round, card_ids),)),
+      threading.Thread(target=worker, args=(lambda: GameService.end_game_early(Game.objects.get(pk=self.game.pk)),)),
+    ]
+    for thread in workers:
+      thread.start()
+    for thread in workers:
+      thread.join()
+
+    self.assertEqual(database_errors, [])
+    self.assertEqual(Game.objects.get(pk=self.game.pk).status, 'ended')
+    self.assertFalse(Round.objects.filter(game=self.game).exists())
+
+
+class StatsSettlementTestCase(TestCase):
+  def setUp(self):
+    self.users = [User.objects.create_user(f'user{i}', f'u{i}@test.com', 'password') for i in range(8)]
+    UserStats.objects.create(user=self.users[0], games_played=3, games_won=1, total_score=12)
+
+  def ended_game(self, players, scores):
+    host = self.users[0]
+    room = Room.objects.create(name='Stats Room', creator=host)
+    game = Game.objects.create(room=room, status='active')
+    for i, (user, score) in enumerate(zip(players, scores), start=1):
+      GamePlayer.objects.create(game=game, user=user, turn_order=i, score=score)
+    return game
+
+  def test_end_game_settles_stats_in_bulk(self):
+    """Existing and new stats rows are updated in a constant number of queries"""
+    game = self.ended_game(self.users[:2], [5, 2])
+    with CaptureQueriesContext(connection) as two_players:
+      GameService.end_game_early(game)
+
+    stats = UserStats.objects.get(user=self.users[0])
+    self.assertEqual((stats.games_played, stats.games_won, stats.total_score), (4, 2, 17))
+    stats = UserStats.objects.get(user=self.users[1])
+    self.assertEqual((stats.games_played, stats.games_won, stats.total_score), (1, 0, 2))
+
+    game = self.ended_game(self.users, [1, 2, 3, 4, 5, 6, 7, 7])
+    with CaptureQueriesContext(connection) as eight_players:
+      GameService.end_game_early(game)
+    self.assertEqual(len(eight_players), len(two_players))
+
+    # Tied at the top - nobody wins
+    game.refresh_from_db()
+    self.assertIsNone(game.winner)
+    self.assertFalse(UserStats.objects.filter(games_won__gt=0).exclude(user=self.users[0]).exists())
+
+
+class LeaderboardTestCase(TestCase):
+  def setUp(self):
+    self.users = [User.objects.create_user(f'user{i}', f'u{i}@test.com', 'password') for i in range(5)]
+    self.room = Room.objects.create(name='Board Room', creator=self.users[0])
+
+  def play(self, scores):
+    """End a game in the room where users[i] scored scores[i]"""
+    Game.objects.filter(room=self.room).delete()
+    game = Game.objects.create(room=self.room, status='active')
+    for i, score in enumerate(scores):
+      GamePlayer.objects.create(game=game, user=self.users[i], turn_order=i, score=score)
+    return GameService.end_game_early(game)
+
+  def test_boards_update_as_games_end(self):
+    """Global, room and weekly boards all pick up each finished game"""
+    self.play([5, 3, 1, 0, 0])
+    self.play([1, 4, 2, 0, 0])
+
+    for board in (leaderboards.GLOBAL_BOARD, leaderboards.room_board(self.room.room_code), leaderboards.week_board()):
+      top = leaderboards.top(board, 2)
+      self.assertEqual([entry.user for entry in top], [self.users[1], self.users[0]])
+      self.assertEqual((top[0].games_played, top[0].games_won, top[0].total_score), (2, 1, 7))
+
+    self.assertEqual(leaderboards.get_rank(leaderboards.GLOBAL_BOARD, self.users[2])[0], 3)
+
+  def test_cursor_pages_walk_the_whole_board(self):
+    """Following next_cursor visits every entry once, in rank order"""
+    self.play([5, 4, 3, 2, 1])
+    seen = []
+    cursor = None
+    while True:
+      entries, cursor = leaderboards.get_page(leaderboards.GLOBAL_BOARD, limit=2, cursor=cursor)
+      seen.extend(entry.user for entry in entries)
+      if cursor is None:
+        break
+    self.assertEqual(seen, self.users)
+
+    self.client.force_login(self.users[3])
+    data = self.client.get(reverse('leaderboard'), {'limit': 2}).json()
+    self.assertEqual([entry['username'] for entry in data['entries']], ['user0', 'user1'])
+    self.assertEqual(data['my_rank'], 4)
+    self.assertEqual(self.client.get(reverse('leaderboard'), {'cursor': 'bogus'}).status_code, 400)
+
+
+class StubCardsHandler(BaseHTTPRequestHandler):
+  """Tiny stand-in for the cards API: one ETag per pack, 503s on request"""
+  hits = []
+  flaky = set()
+
+  def do_GET(self):
+    pack = parse_qs(urlparse(self.path).query)['packs'][0]
+    StubCardsHandler.hits.append((pack, self.headers.get('If-None-Match')))
+    if pack in StubCardsHandler.flaky:
+      StubCardsHandler.flaky.discard(pack)
+      self.send_response(503)
+      self.end_headers()
+      return
+
+    etag = f'"{pack}-v1"'
+    if self.headers.get('If-None-Match') == etag:
+      self.send_response(304)
+      self.end_headers()
+      return
+
+    body = json.dumps({
+      'black': [{'text': f'{pack} question _', 'pick': 1, 'pack': pack}],
+      'white': [{'text': f'{pack} answer {i}', 'pack': pack} for i in range(3)],
+    }).encode()
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.send_header('ETag', etag)
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class AsyncCardsAPIClientTestCase(TwoPlayerGameMixin, TestCase):
+  def setUp(self):
+    StubCardsHandler.hits = []
+    StubCardsHandler.flaky = set()
+    self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCardsHandler)
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    self.addCleanup(self.server.server_close)
+    self.addCleanup(self.server.shutdown)
+
+    self.client_api = AsyncCardsAPIClient(max_concurrency=4, backoff=0)
+    self.client_api.BASE_URL = f'http://127.0.0.1:{self.server.server_port}'
+    self.addCleanup(self.client_api.close)
+    cache.clear()
+
+  def test_fetches_packs_concurrently_with_retries(self):
+    """Every pack comes back, and a 503 is retried rather than failing the pack"""
+    packs = [f'Pack {i}' for i in range(10)]
+    StubCardsHandler.flaky = {'Pack 3'}
+    results = self.client_api.get_packs(packs)
+
+    self.assertEqual(list(results), packs)
+    self.assertEqual(results['Pack 3']['black'][0]['text'], 'Pack 3 question _')
+    self.assertEqual(len(StubCardsHandler.hits), 11)
+
+  def test_unchanged_packs_are_revalidated(self):
+    """A second sync sends the ETag back and reuses the cached body on 304"""
+    first = self.client_api.get_packs(['Pack A'])
+    second = self.client_api.get_packs(['Pack A'])
+
+    self.assertEqual(first, second)
+    self.assertEqual(StubCardsHandler.hits, [('Pack A', None), ('Pack A', '"Pack A-v1"')])
+
+  def test_sync_cards_upserts_each_pack_in_fixed_queries(self):
+    """Re-syncing adds nothing new, reactivates cards and keeps pack counts right"""
+    with patch.object(AsyncCardsAPIClient, 'BASE_URL', self.client_api.BASE_URL):
+      call_command('sync_cards', packs=['Pack A', 'Pack B'], stdout=StringIO())
+      Card.objects.filter(pack__name='Pack A').update(is_active=False)
+
+      output = StringIO()
+      with CaptureQueriesContext(connection) as queries:
+        call_command('sync_cards', packs=['Pack A', 'Pack B'], stdout=output)
+
+    self.assertIn('0 new cards added', output.getvalue())
+    self.assertFalse(Card.objects.filter(is_active=False).exists())
+    pack = CardPack.objects.get(name='Pack A')
+    self.assertEqual((pack.black_card_count, pack.white_card_count, pack.card_count), (1, 3, 4))
+    self.assertLess(len(queries), 25)
+
+  def test_clear_keeps_cards_running_games_hold(self):
+    """--clear deactivates cards in hands and submissions instead of deleting them out of the game"""
+    self.set_up_started_game('Live')
+    player = self.game.players.exclude(user=self.round.judge).get()
+    GameService.submit_card(player, self.round, hand_picks(player, self.round))
+    in_play = set(HandCard.objects.values_list('card_id', flat=True)) | set(SubmissionCard.objects.values_list('card_id', flat=True))
+
+    with patch.object(AsyncCardsAPIClient, 'BASE_URL', self.client_api.BASE_URL):
+      call_command('sync_cards', packs=['Pack A'], clear=True, stdout=StringIO())
+
+    self.assertEqual(HandCard.objects.count(), 20)
+    self.assertEqual(SubmissionCard.objects.count(), 1)
+    self.assertEqual(set(Card.objects.filter(pack=self.pack).values_list('id', flat=True)), in_play)
+    self.assertFalse(Card.objects.filter(pack=self.pack, is_active=True).exists())
+    self.assertTrue(Card.objects.filter(pack__name='Pack A', is_active=True).exists())
+
+
+class StreamingImportTestCase(TestCase):
+  def write_json(self, data):
+    handle = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+    with handle:
+      json.dump(data, handle, indent=2)
+    self.addCleanup(os.remove, handle.name)
+    return handle.name
+
+  def test_iter_array_matches_json_load_for_any_chunk_size(self):
+    """Items split across chunk boundaries still decode exactly"""
+    data = [{'name': f'Pack {i}', 'black': [{'text': '_ ' * i}], 'weight': i * 1.5} for i in range(50)] + [12, 'x', None]
+    text = json.dumps(data, indent=2)
+    for chunk_size in (1, 7, 1024):
+      self.assertEqual(list(iter_array(StringIO(text), chunk_size)), data)
+    with self.assertRaises(ValueError):
+      list(iter_array(StringIO('[{"a": 1}, {"b"'), 4))
+
+  def test_large_items_are_decoded_a_bounded_number_of_times(self):
+    """An item spanning many chunks grows the reads instead of re-decoding once per chunk"""
+    data = [{'name': 'Big', 'white': [{'text': f'Card {i}'} for i in range(5000)]}, {'name': 'Small'}]
+    stream = StringIO(json.dumps(data))
+    with patch.object(json.JSONDecoder, 'raw_decode', autospec=True, side_effect=json.JSONDecoder.raw_decode) as raw_decode:
+      self.assertEqual(list(iter_array(stream, 64)), data)
+    self.assertLess(raw_decode.call_count, 20)
+
+  def test_github_import_streams_in_batches(self):
+    """Cards land in their expansions once, with pack counts refreshed"""
+    cards = (
+      [{'cardType': 'Q', 'text': f'Question {i} _ _', 'numAnswers': 2, 'expansion': f'Exp {i % 2}'} for i in range(4)] +
+      [{'cardType': 'A', 'text': f'Answer {i}', 'expansion': f'Exp {i % 2}'} for i in range(10)] +
+      [{'cardType': 'A', 'text': 'Answer 0', 'expansion': 'Exp 0'}]
+    )
+    path = self.write_json(cards)
+
+    output = StringIO()
+    call_command('import_github_cards', file=path, batch_size=3, stdout=output)
+    self.assertIn('Added 4 black, 10 white cards', output.getvalue())
+    call_command('import_github_cards', file=path, batch_size=3, stdout=output)
+    self.assertIn('Added 0 black, 0 white cards', output.getvalue())
+
+    pack = CardPack.objects.get(name='[GitHub] Exp 0')
+    self.assertEqual(pack.description, 'Cards from GitHub - Exp 0')
+    self.assertEqual((pack.black_card_count, pack.white_card_count, pack.card_count), (2, 5, 7))
+    self.assertEqual(set(Card.objects.filter(card_type='black').values_list('pick', flat=True)), {2})
+
+  def test_failed_batch_is_reported_and_the_import_continues(self):
+    """A batch that fails rolls back on its own; the rest of the file still lands"""
+    cards = [{'cardType': 'A', 'text': f'Answer {i}', 'expansion': f'Exp {i // 3}'} for i in range(9)]
+    path = self.write_json(cards)
+    bulk_create = Card.objects.bulk_create
+    calls = []
+
+    def fail_second_batch(objs, **kwargs):
+      calls.append(len(objs))
+      if len(calls) == 2:
+        raise ValueError('bad batch')
+      return bulk_create(objs, **kwargs)
+
+    output = StringIO()
+    with patch.object(Card.objects, 'bulk_create', side_effect=fail_second_batch):
+      call_command('import_github_cards', file=path, batch_size=3, stdout=output)
+    self.assertIn('Error in [GitHub] Exp 1: bad batch', output.getvalue())
+    self.assertIn('Added 0 black, 6 white cards', output.getvalue())
+    self.assertEqual(
+      set(CardPack.objects.values_list('name', 'card_count')),
+      {('[GitHub] Exp 0', 3), ('[GitHub] Exp 2', 3)}
+    )
+
+
+class ParallelImportTestCase(TransactionTestCase):
+  def test_workers_import_packs_with_in_memory_counts(self):
+    """Packs split across worker processes import once, with correct counts"""
+    packs = [
+      {'name': f'Pack {i}', 'black': [{'text': f'Q{i} {j} _'} for j in range(3)], 'white': [{'text': f'A{i} {j}'} for j in range(7)]}
+      for i in range(6)
+    ]
+    handle = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+    with handle:
+      json.dump(packs, handle)
+    self.addCleanup(os.remove, handle.name)
+
+    output = StringIO()
+    options = {}
+    if connection.vendor == 'sqlite':
+      # Concurrent SQLite writers must take the write lock up front instead of failing to upgrade
+      options = {'transaction_mode': 'IMMEDIATE'}
+    with patch.dict(connection.settings_dict['OPTIONS'], options):
+      call_command('import_cards', file=handle.name, workers=2, batch_size=4, stdout=output)
+      self.assertIn('New cards: 18 black, 42 white', output.getvalue())
+      call_command('import_cards', file=handle.name, workers=2, batch_size=4, stdout=output)
+      self.assertIn('New cards: 0 black, 0 white', output.getvalue())
+
+    self.assertEqual(Card.objects.count(), 60)
+    self.assertEqual(
+      set(CardPack.objects.values_list('black_card_count', 'white_card_count', 'card_count')),
+      {(3, 7, 10)}
+    )
+
+
+class FindMissingCardsTestCase(TestCase):
+  def test_reports_missing_and_misfiled_cards(self):
+    """Cards are diffed against one index of the table, with JSON and CSV output"""
+    base = CardPack.objects.create(name='Base')
+    extra = CardPack.objects.create(name='Extra')
+    Card.objects.create(text='Known _', card_type='black', pack=base)
+    Card.objects.create(text='Moved answer', card_type='white', pack=extra)
+
+    handle = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+    with handle:
+      json.dump([{
+        'name': 'Base',
+        'black': [{'text': 'Known _'}, {'text': 'New _'}],
+        'white': [{'text': 'Moved answer'}],
+      }], handle)
+    self.addCleanup(os.remove, handle.name)
+
+    with self.assertNumQueries(2):
+      output = StringIO()
+      call_command('find_missing_cards', file=handle.name, format='json', stdout=output)
+    records = json.loads(output.getvalue())
+    self.assertEqual(records, [
+      {'status': 'missing', 'type': 'black', 'text': 'New _', 'api_pack': 'Base', 'db_packs': ''},
+      {'status': 'duplicate', 'type': 'white', 'text': 'Moved answer', 'api_pack': 'Base', 'db_packs': 'Extra'},
+    ])
+
+    output = StringIO()
+    call_command('find_missing_cards', file=handle.name, format='csv', stdout=output)
+    rows = list(csv.DictReader(StringIO(output.getvalue())))
+    self.assertEqual([row['status'] for row in rows], ['missing', 'duplicate'])
+
+
+class FixPickValuesTestCase(TestCase):
+  def test_picks_follow_blanks_with_a_minimum_of_one(self):
+    """Blank runs set the pick, cards without blanks still take one answer"""
+    self.assertEqual(pick_from_text('No blanks here?'), 1)
+    self.assertEqual(pick_from_text('____ and ___ make _'), 3)
+
+    pack = CardPack.objects.create(name='Pick Pack')
+    Card.objects.bulk_create([
+      Card(text='Make a haiku.', card_type='black', pack=pack, pick=3),
+      Card(text='Two _ _', card_type='black', pack=pack, pick=-1),
+      Card(text='None?', card_type='black', pack=pack, pick=0),
+      Card(text='Fine _', card_type='black', pack=pack, pick=1),
+      Card(text='Also fine _', card_type='black', pack=pack, pick=1),
+    ])
+
+    output = StringIO()
+    call_command('fix_pick_values', dry_run=True, chunk_size=2, stdout=output)
+    self.assertIn('Found 2 cards needing updates', output.getvalue())
+
+    # Only the missing or invalid picks change - a source's multi-pick without blanks stays
+    output = StringIO()
+    call_command('fix_pick_values', no_input=True, chunk_size=2, stdout=output)
+    self.assertIn('Successfully updated 2 cards', output.getvalue())
+    self.assertEqual(
+      dict(Card.objects.values_list('text', 'pick')),
+      {'Make a haiku.': 3, 'Two _ _': 2, 'None?': 1, 'Fine _': 1, 'Also fine _': 1}
+    )
+
+  def test_imports_keep_the_source_pick(self):
+    """A pick given by the source wins; blanks are only counted when it has none"""
+    self.assertEqual(source_pick('Make a haiku.', 3), 3)
+    self.assertEqual(source_pick('_ meets _.', None), 2)
+
+    handle = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+    with handle:
+      json.dump([
+        {'cardType': 'Q', 'text': 'Make a haiku.', 'numAnswers': 3, 'expansion': 'Picks'},
+        {'cardType': 'Q', 'text': '_ meets _.', 'expansion': 'Picks'},
+      ], handle)
+    self.addCleanup(os.remove, handle.name)
+    call_command('import_github_cards', file=handle.name, stdout=StringIO())
+    self.assertEqual(dict(Card.objects.values_list('text', 'pick')), {'Make a haiku.': 3, '_ meets _.': 2})
+
+
+class InactiveRoomCleanupTestCase(TwoPlayerGameMixin, TestCase):
+  def setUp(self):
+    self.create_players_and_pack('Cleanup')
+
+  def played_room(self, name):
+    """A room with a game one round in: a judged submission and a fresh round"""
+    round_obj = self.start_two_player_game(name)
+    game = round_obj.game
+    room = game.room
+    RoomMembership.objects.create(user=self.host, room=room)
+    player = game.players.exclude(user=round_obj.judge).get()
+    submission = GameService.submit_card(player, round_obj, hand_picks(player, round_obj))
+    GameService.select_winner(round_obj, str(submission.id), game.players.get(user=round_obj.judge))
+    GameService.create_round(game)
+    return room
+
+  def test_activity_keeps_rooms_and_bulk_purge_removes_the_rest(self):
+    """Only rooms idle past the cutoff go, along with every row under them"""
+    stale = self.played_room('Stale')
+    fresh = self.played_room('Fresh')
+    Room.objects.update(last_activity=timezone.now() - timedelta(days=30))
+    invalidate_game_status_cache(fresh.room_code)
+
+    call_command('delete_inactive_rooms', bulk=True, stdout=StringIO())
+
+    self.assertEqual(list(Room.objects.values_list('name', flat=True)), ['Fresh'])
+    self.assertFalse(Game.objects.filter(room_id=stale.id).exists())
+    self.assertEqual(Round.objects.count(), 2)
+    self.assertEqual(CardSubmission.objects.count(), 1)
+    self.assertEqual(GamePlayer.objects.count(), 2)
+    self.assertEqual(RoomMembership.objects.count(), 1)
+    self.assertEqual(Room.selected_packs.through.objects.count(), 1)
+
+
+class GameArchiveTestCase(TwoPlayerGameMixin, TestCase):
+  def setUp(self):
+    self.set_up_started_game('Archive', round_limit=1)
+
+  def test_last_round_archives_the_game(self):
+    """Ending a game leaves one history row and only the Game/GamePlayer rows"""
+    player = self.game.players.exclude(user=self.round.judge).get()
+    card = player.hand_cards.select_related('card').first().card
+    submission = GameService.submit_card(player, self.round, [str(card.id)])
+    game = GameService.select_winner(self.round, str(submission.id), self.game.players.get(user=self.round.judge))
+
+    history = GameHistory.objects.get(game=game)
+    self.assertEqual((history.round_count, history.player_count, history.winner_id), (1, 2, player.user_id))
+    data = history.unpack()
+    self.assertEqual(data['rounds'][0]['submissions'][0]['white_cards'], [{'id': card.id, 'text': card.text}])
+    self.assertEqual({p['username']: p['score'] for p in data['players']}, {'host': 0, 'player1': 0} | {player.user.username: 1})
+
+    self.assertFalse(Round.objects.exists())
+    self.assertFalse(CardSubmission.objects.exists())
+    self.assertFalse(HandCard.objects.exists())
+
+    self.client.force_login(self.host)
+    response = self.client.get(reverse('game_results', args=[self.room.room_code]))
+    self.assertContains(response, 'player1')
+
+  def test_command_archives_games_ended_earlier(self):
+    """Ended games without a history row are picked up by archive_games"""
+    Game.objects.filter(pk=self.game.pk).update(status='ended', ended_at=timezone.now())
+    call_command('archive_games', stdout=StringIO())
+    self.assertEqual(GameHistory.objects.get().round_count, 1)
+    self.assertFalse(Round.objects.exists())
+
+
+class CardPoolTestCase(TestCase):
+  def setUp(self):
+    self.host = User.objects.create_user('host', 'host@test.com', 'password')
+    self.pack = CardPack.objects.create(name='Pool Pack')
+    Card.objects.bulk_create(
+      [Card(text=f'White {i}', card_type='white', pack=self.pack) for i in range(20)] +
+      [Card(text=f'Black {i} _', card_type='black', pack=self.pack) for i in range(3)]
+    )
+
+  def make_game(self, packs):
+    room = Room.objects.create(name='Pool Room', creator=self.host)
+    room.selected_packs.set(packs)
+    card_pools.assign_room_pool(room)
+    return Game.objects.create(room=room)
+
+  def write_json(self, data):
+    handle = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+    with handle:
+      json.dump(data, handle)
+    self.addCleanup(os.remove, handle.name)
+    return handle.name
+
+  def test_rooms_with_the_same_packs_share_one_pool(self):
+    """The pool is keyed by the pack set and building decks reads it in one query"""
+    first = self.make_game([self.pack])
+    second = self.make_game([self.pack])
+    self.assertEqual(CardPool.objects.count(), 1)
+    self.assertEqual(first.room.card_pool_id, second.room.card_pool_id)
+
+    with self.assertNumQueries(2):
+      self.assertTrue(GameService.build_decks(second))
+    self.assertEqual(sorted(second.white_deck), sorted(Card.objects.filter(card_type='white').values_list('id', flat=True)))
+    self.assertEqual(len(second.black_deck), 3)
+
+  def test_imports_invalidate_the_pools_of_their_packs(self):
+    """New cards reach rooms through a rebuilt pool; other packs' pools are untouched"""
+    game = self.make_game([self.pack])
+    other_pack = CardPack.objects.create(name='Other Pack')
+    Card.objects.create(text='Other white', card_type='white', pack=other_pack)
+    other_game = self.make_game([other_pack])
+
+    path = self.write_json([{'name': 'Pool Pack', 'white': [{'text': 'Fresh white'}], 'black': []}])
+    output = StringIO()
+    call_command('import_cards', file=path, stdout=output)
+    self.assertIn('Invalidated 1 card pools', output.getvalue())
+    self.assertTrue(CardPool.objects.filter(pk=other_game.room.card_pool_id).exists())
+
+    game = Game.objects.select_related('room').get(pk=game.pk)
+    self.assertIsNone(game.room.card_pool_id)
+    GameService.build_decks(game)
+    self.assertIn(Card.objects.get(text='Fresh white').id, game.white_deck)
+    self.assertEqual(CardPool.objects.count(), 2)
+
+  def test_rooms_without_packs_pick_up_new_default_packs(self):
+    """A room on the defaults resolves them again once a default pack is imported"""
+    game = self.make_game([])
+    self.assertFalse(GameService.build_decks(game))
+
+    path = self.write_json([{'name': 'CAH Base Set', 'white': [{'text': 'Base white'}], 'black': [{'text': 'Base black _'}]}])
+    call_command('import_cards', file=path, stdout=StringIO())
+
+    game = Game.objects.select_related('room').get(pk=game.pk)
+    self.assertTrue(GameService.build_decks(game))
+    self.assertEqual(game.white_deck, [Card.objects.get(text='Base white').id])
@@ -21,4 +21,6 @@ urlpatterns = [
   path('room/<str:room_code>/results/', views.game_results, name='game_results'),
   path('room/<str:room_code>/end/', views.end_game, name='end_game'),
   path('room/<str:room_code>/timer/', views.check_timer, name='check_timer'),
+  path('leaderboard/', views.leaderboard, name='leaderboard'),
+  path('internal/cache-stats/', views.cache_stats, name='cache_stats'),
 ]
\ No newline at end of file
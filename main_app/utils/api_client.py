@@ -1,7 +1,14 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
 from django.core.cache import cache
+from array import array
+import asyncio
+import bisect
+import hashlib
 import logging
+import random
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +17,12 @@ class CardsAPIClient:
 
   DEFAULT_PACKS = ["CAH Base Set", "CAH: First Expansion", "CAH: Second Expansion", "CAH: Third Expansion"]
 
+  # Cards per cached text chunk - a draw only reads the chunks it lands in
+  POOL_TEXT_CHUNK = 64
+
+  # (connect, read) seconds - a hung API must not hang a page
+  TIMEOUT = (3.05, 10)
+
   def __init__(self):
     self.session = requests.Session()
     self.session.headers.update({
@@ -24,7 +37,7 @@ class CardsAPIClient:
     
     if not packs:
       try:
-        response = self.session.get(f"{self.BASE_URL}/packs")
+        response = self.session.get(f"{self.BASE_URL}/packs", timeout=self.TIMEOUT)
         response.raise_for_status()
         packs = response.json()
         # Cache for 24 hours
@@ -50,8 +63,9 @@ class CardsAPIClient:
         # v2 API expects comma-separated pack names
         packs_param = ",".join(packs)
         response = self.session.get(
-          f"{self.BASE_URL}/cards", 
-          params={'packs': packs_param}
+          f"{self.BASE_URL}/cards",
+          params={'packs': packs_param},
+          timeout=self.TIMEOUT
         )
         response.raise_for_status()
         cards = response.json()
@@ -65,51 +79,136 @@ class CardsAPIClient:
     return cards
 
   def get_black_cards(self, count=1, packs=None):
-    """Get random black cards (questions) with improved caching"""
+    """Get random black cards (questions) from the packs' pools"""
     if packs is None:
       packs = self.DEFAULT_PACKS
-    
-    # Check if we have cached black cards (sanitize for memcached compatibility)
-    pack_string = '_'.join(sorted(packs)).replace(' ', '_').replace(':', '')
-    cache_key = f"black_cards_pool_{pack_string}"
-    black_cards_pool = cache.get(cache_key)
-    
-    if not black_cards_pool:
-      all_cards = self.get_cards(packs)
-      all_black_cards = all_cards.get('black', [])
-      black_cards_pool = [card for card in all_black_cards if card.get('pick', 1) == 1]
-      # Cache the pool for 30 minutes
-      cache.set(cache_key, black_cards_pool, 1800)
-    
-    if len(black_cards_pool) < count:
-      logger.warning(f"Only {len(black_cards_pool)} black cards with pick=1 available, requested {count}")
-      return black_cards_pool
-    
-    import random
-    return random.sample(black_cards_pool, count)
+    return self._sample_pools(packs, 'black', count)
 
   def get_white_cards(self, count=10, packs=None):
-    """Get random white cards (answers) with improved caching"""
+    """Get random white cards (answers) from the packs' pools"""
     if packs is None:
-      packs =  self.DEFAULT_PACKS
-    
-    # Check if we have cached white cards (sanitize for memcached compatibility)
-    pack_string = '_'.join(sorted(packs)).replace(' ', '_').replace(':', '')
-    cache_key = f"white_cards_pool_{pack_string}"
-    white_cards_pool = cache.get(cache_key)
-    
-    if not white_cards_pool:
-      all_cards = self.get_cards(packs)
-      white_cards_pool = all_cards.get('white', [])
-      # Cache the pool for 30 minutes
-      cache.set(cache_key, white_cards_pool, 1800)
-    
-    if len(white_cards_pool) < count:
-      logger.warning(f"Only {len(white_cards_pool)} white cards available, requested {count}")
-      return white_cards_pool
-    
-    import random
-    return random.sample(white_cards_pool, count)
+      packs = self.DEFAULT_PACKS
+    return self._sample_pools(packs, 'white', count)
+
+  def _pool_key(self, pack):
+    """Cache key for one pack's pool (sanitized for memcached compatibility)"""
+    return f"card_pool_{pack.replace(' ', '_').replace(':', '')}"
+
+  def _build_pack_pool(self, pack, cards):
+    """Compact a pack into an interned text table plus per-color index arrays"""
+    texts = []
+    positions = {}
+    indices = {'white': array('I'), 'black': array('I')}
+    # How many white cards each black card takes, in step with indices['black']
+    black_picks = array('B')
+
+    for color in ('white', 'black'):
+      for card in cards.get(color, []):
+        text = card['text']
+        if text not in positions:
+          positions[text] = len(texts)
+          texts.append(text)
+        indices[color].append(positions[text])
+        if color == 'black':
+          black_picks.append(min(max(card.get('pick', 1), 1), 255))
+
+    pool = {
+      'white': indices['white'].tobytes(),
+      'black': indices['black'].tobytes(),
+      'black_picks': black_picks.tobytes(),
+    }
+    text_chunks = {
+      f"{self._pool_key(pack)}_texts_{start // self.POOL_TEXT_CHUNK}": texts[start:start + self.POOL_TEXT_CHUNK]
+      for start in range(0, len(texts), self.POOL_TEXT_CHUNK)
+    }
+    return pool, text_chunks
+
+  def _get_pack_pools(self, packs):
+    """Load each pack's index arrays, building and caching any that are missing"""
+    cached = cache.get_many([self._pool_key(pack) for pack in packs])
+    pools = {pack: cached[self._pool_key(pack)] for pack in packs if self._pool_key(pack) in cached}
+
+    missing = [pack for pack in packs if pack not in pools]
+    if missing:
+      all_cards = self.get_cards(missing)
+
+      # Split the response back into packs
+      by_pack = {}
+      for color in ('white', 'black'):
+        for card in all_cards.get(color, []):
+          by_pack.setdefault(card.get('pack', 'Unknown'), {'white': [], 'black': []})[color].append(card)
+
+      to_cache = {}
+      for pack in missing:
+        if pack not in by_pack:
+          # Nothing came back for this pack (the API is down and served fallback
+          # cards) - don't cache an empty pool, try the API again next draw
+          continue
+        pool, text_chunks = self._build_pack_pool(pack, by_pack.pop(pack))
+        pools[pack] = pool
+        to_cache[self._pool_key(pack)] = pool
+        to_cache.update(text_chunks)
+      # Cache the pools for 30 minutes
+      if to_cache:
+        cache.set_many(to_cache, 1800)
+
+      # Anything left came from the fallback cards - use it, but don't cache it
+      for pack, cards in by_pack.items():
+        pool, text_chunks = self._build_pack_pool(pack, cards)
+        pools[pack] = pool
+        cache.set_many(text_chunks, 60)
+
+    return pools
+
+  def _sample_pools(self, packs, color, count):
+    """Sample cards from the union of the packs' pools, materializing only the picks"""
+    pools = self._get_pack_pools(packs)
+
+    # Lay the packs' index arrays end to end
+    arrays = []
+    offsets = []
+    total = 0
+    for pack, pool in pools.items():
+      indices = array('I')
+      indices.frombytes(pool[color])
+      # Pools cached before picks were kept only hold single-pick black cards
+      card_picks = array('B')
+      card_picks.frombytes(pool.get('black_picks', b''))
+      if indices:
+        arrays.append((pack, indices, card_picks))
+        offsets.append(total)
+        total += len(indices)
+
+    if total < count:
+      logger.warning(f"Only {total} {color} cards available, requested {count}")
+
+    picks = []
+    for position in random.sample(range(total), min(count, total)):
+      slot = bisect.bisect_right(offsets, position) - 1
+      pack, indices, card_picks = arrays[slot]
+      offset = position - offsets[slot]
+      pick = card_picks[offset] if offset < len(card_picks) else 1
+      picks.append((pack, indices[offset], pick))
+
+    # Fetch only the text chunks the picks fall in
+    chunk_keys = {
+      (pack, index // self.POOL_TEXT_CHUNK): f"{self._pool_key(pack)}_texts_{index // self.POOL_TEXT_CHUNK}"
+      for pack, index, _ in picks
+    }
+    chunks = cache.get_many(chunk_keys.values())
+
+    cards = []
+    for pack, index, pick in picks:
+      chunk = chunks.get(chunk_keys[(pack, index // self.POOL_TEXT_CHUNK)])
+      if chunk is None:
+        # Text chunk expired before its pool - rebuild on the next draw
+        cache.delete(self._pool_key(pack))
+        continue
+      card = {'text': chunk[index % self.POOL_TEXT_CHUNK], 'pack': pack}
+      if color == 'black':
+        card['pick'] = pick
+      cards.append(card)
+    return cards
 
   def _get_fallback_packs(self):
     """Fallback pack list if API is down"""
@@ -184,5 +283,88 @@ class CardsAPIClient:
       ]
     }
 
+class AsyncCardsAPIClient:
+  """Concurrent pack fetcher for bulk syncs.
+
+  Requests run on worker threads over one pooled session, at most
+  max_concurrency at a time. Failed connections and 429/5xx responses are
+  retried with exponential backoff, and every response's ETag/Last-Modified
+  is kept in the cache so unchanged packs come back as cheap 304s.
+  """
+
+  BASE_URL = CardsAPIClient.BASE_URL
+
+  # Validators and bodies for conditional requests are kept for a week
+  CONDITIONAL_TTL = 7 * 86400
+
+  def __init__(self, max_concurrency=8, timeout=(3.05, 30), retries=3, backoff=0.5):
+    self.max_concurrency = max_concurrency
+    self.timeout = timeout
+
+    retry = Retry(
+      total=retries,
+      backoff_factor=backoff,
+      status_forcelist=(429, 500, 502, 503, 504),
+      allowed_methods=('GET',),
+      respect_retry_after_header=True,
+    )
+    # One connection per concurrent request, reused across the whole sync
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+    self.session = requests.Session()
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+    self.session.headers.update({
+      'User-Agent': 'Django-Cards-Against-Humanity/1.0',
+      'Accept': 'application/json'
+    })
+
+  def _conditional_key(self, url, params):
+    request_id = f"{url}?{sorted((params or {}).items())}"
+    return f"api_conditional_{hashlib.sha1(request_id.encode()).hexdigest()}"
+
+  def get_json(self, url, params=None):
+    """GET a JSON body, revalidating any cached copy instead of downloading it again"""
+    cache_key = self._conditional_key(url, params)
+    cached = cache.get(cache_key)
+
+    headers = {}
+    if cached:
+      if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+      if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+    if response.status_code == 304 and cached:
+      return cached['data']
+    response.raise_for_status()
+
+    data = response.json()
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+      cache.set(cache_key, {'etag': etag, 'last_modified': last_modified, 'data': data}, self.CONDITIONAL_TTL)
+    return data
+
+  async def fetch_pack(self, semaphore, pack):
+    async with semaphore:
+      return await asyncio.to_thread(self.get_json, f"{self.BASE_URL}/cards", {'packs': pack})
+
+  async def fetch_packs(self, packs):
+    """Fetch packs concurrently; returns {pack: cards dict or the exception it raised}"""
+    semaphore = asyncio.Semaphore(self.max_concurrency)
+    results = await asyncio.gather(
+      *(self.fetch_pack(semaphore, pack) for pack in packs),
+      return_exceptions=True
+    )
+    return dict(zip(packs, results))
+
+  def get_packs(self, packs):
+    """Blocking wrapper around fetch_packs for management commands"""
+    return asyncio.run(self.fetch_packs(list(packs)))
+
+  def close(self):
+    self.session.close()
+
 # Global instance
 cards_api = CardsAPIClient()
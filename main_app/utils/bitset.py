@@ -0,0 +1,52 @@
+class Bitset:
+  """A set of small non-negative ints packed into the bits of one Python int.
+
+  Membership, add and discard are single bit operations and len() is a
+  popcount, however many members there are. Stored as little-endian bytes
+  (to_bytes/from_bytes), so 1000 positions take 125 bytes at most.
+  """
+
+  __slots__ = ('bits',)
+
+  def __init__(self, positions=()):
+    self.bits = 0
+    self.update(positions)
+
+  @classmethod
+  def from_bytes(cls, data):
+    """Rebuild a bitset from to_bytes() output (bytes, or the memoryview some databases return)"""
+    bitset = cls()
+    bitset.bits = int.from_bytes(data or b'', 'little')
+    return bitset
+
+  def to_bytes(self):
+    return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+
+  def add(self, position):
+    self.bits |= 1 << position
+
+  def discard(self, position):
+    self.bits &= ~(1 << position)
+
+  def update(self, positions):
+    for position in positions:
+      self.bits |= 1 << position
+
+  def __contains__(self, position):
+    return position >= 0 and bool(self.bits >> position & 1)
+
+  def __len__(self):
+    return self.bits.bit_count()
+
+  def __iter__(self):
+    bits = self.bits
+    while bits:
+      lowest = bits & -bits
+      yield lowest.bit_length() - 1
+      bits ^= lowest
+
+  def __eq__(self, other):
+    return isinstance(other, Bitset) and self.bits == other.bits
+
+  def __repr__(self):
+    return f'Bitset({list(self)})'
@@ -0,0 +1,259 @@
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from ..models import Card, CardPack
+import django
+import re
+import time
+import zlib
+
+# Any run of underscores is one blank
+BLANK = re.compile(r'_+')
+
+
+def pick_from_text(text):
+  """Number of white cards a black card takes - its blanks, and never fewer than one"""
+  return max(1, len(BLANK.findall(text)))
+
+
+def source_pick(text, pick=None):
+  """The pick a card source gives for a black card, or its blank count when it gives none (or no valid one)"""
+  if isinstance(pick, int) and pick >= 1:
+    return pick
+  return pick_from_text(text)
+
+
+class CardBatchWriter:
+  """Write a stream of imported cards to the database in bounded batches.
+
+  Cards are buffered up to batch_size, then checked against the texts their
+  packs already hold in one query and inserted with bulk_create, so memory
+  stays at one batch however large the source file is. A card whose text is
+  already in its pack is skipped, as the import commands always have. A
+  batch that fails is rolled back and recorded in errors with its pack
+  names, and the import carries on with the next one.
+  """
+
+  def __init__(self, batch_size=1000, describe_pack=None, progress=None, progress_every=5000):
+    self.batch_size = batch_size
+    self.describe_pack = describe_pack or (lambda name: '')
+    self.progress = progress
+    self.progress_every = progress_every
+
+    self.packs = {}
+    self.batch = []
+    self.seen = 0
+    self.created = {'black': 0, 'white': 0}
+    self.errors = []
+    self.started = time.monotonic()
+    self._next_report = progress_every
+
+  def add(self, pack_name, card_type, text, pick=None):
+    """Queue one card; flushes once the batch is full"""
+    pack_name = pack_name.strip()
+    text = text.strip()
+    if not pack_name or not text:
+      return
+    pick = source_pick(text, pick) if card_type == 'black' else 1
+    self.batch.append((pack_name, card_type, text, pick))
+    self.seen += 1
+    if len(self.batch) >= self.batch_size:
+      self.flush()
+
+  def get_pack_id(self, name):
+    if name not in self.packs:
+      pack, _ = CardPack.objects.get_or_create(name=name, defaults={'description': self.describe_pack(name)})
+      self.packs[name] = pack.id
+    return self.packs[name]
+
+  def flush(self):
+    """Insert the buffered cards that their packs don't already have"""
+    if not self.batch:
+      return
+    batch, self.batch = self.batch, []
+    try:
+      created = self._write(batch)
+    except Exception as e:
+      names = {name for name, _, _, _ in batch}
+      self.errors.append((', '.join(sorted(names)), e))
+      # Forget packs whose creation was rolled back with the batch
+      alive = set(CardPack.objects.filter(id__in=[self.packs[name] for name in names if name in self.packs]).values_list('id', flat=True))
+      for name in names:
+        if self.packs.get(name) not in alive:
+          self.packs.pop(name, None)
+    else:
+      for card_type, count in created.items():
+        self.created[card_type] += count
+
+    if self.progress and self.seen >= self._next_report:
+      self._next_report = self.seen + self.progress_every
+      self.progress(self)
+
+  @transaction.atomic
+  def _write(self, batch):
+    rows = [(self.get_pack_id(name), card_type, text, pick) for name, card_type, text, pick in batch]
+
+    # Texts these packs already hold, for this batch only (ONE QUERY)
+    existing = set(Card.objects.filter(
+      pack_id__in={pack_id for pack_id, _, _, _ in rows},
+      text__in={text for _, _, text, _ in rows}
+    ).values_list('pack_id', 'text'))
+
+    cards_to_create = []
+    created = {'black': 0, 'white': 0}
+    for pack_id, card_type, text, pick in rows:
+      if (pack_id, text) not in existing:
+        cards_to_create.append(Card(text=text, card_type=card_type, pack_id=pack_id, pick=pick))
+        existing.add((pack_id, text))
+        created[card_type] += 1
+    Card.objects.bulk_create(cards_to_create, batch_size=500)
+    return created
+
+  @property
+  def rate(self):
+    """Cards read per second so far"""
+    elapsed = time.monotonic() - self.started
+    return self.seen / elapsed if elapsed else 0
+
+  def close(self):
+    """Flush what's left and refresh the counts of every pack that was touched"""
+    self.flush()
+    counts = Card.objects.filter(pack_id__in=self.packs.values()).values('pack_id').annotate(
+      black=Count('id', filter=Q(card_type='black')),
+      white=Count('id', filter=Q(card_type='white')),
+    )
+    packs = []
+    for row in counts:
+      packs.append(CardPack(
+        id=row['pack_id'],
+        black_card_count=row['black'],
+        white_card_count=row['white'],
+        card_count=row['black'] + row['white'],
+      ))
+    CardPack.objects.bulk_update(packs, ['black_card_count', 'white_card_count', 'card_count'], batch_size=500)
+
+
+def write_pack_chunk(pack_name, description, cards):
+  """Insert one chunk of a pack's (card_type, text, pick) cards in its own transaction.
+
+  The pack's counts are worked out from the texts it already had plus what
+  was inserted, without counting queries. Returns the number created per color.
+  """
+  with transaction.atomic():
+    pack, _ = CardPack.objects.get_or_create(name=pack_name, defaults={'description': description})
+    existing = dict(pack.cards.values_list('text', 'card_type'))
+    counts = Counter(existing.values())
+
+    cards_to_create = []
+    for card_type, text, pick in cards:
+      if text not in existing:
+        existing[text] = card_type
+        cards_to_create.append(Card(text=text, card_type=card_type, pack=pack, pick=pick))
+    Card.objects.bulk_create(cards_to_create, batch_size=500)
+
+    created = Counter(card.card_type for card in cards_to_create)
+    counts.update(created)
+    pack.black_card_count = counts['black']
+    pack.white_card_count = counts['white']
+    pack.card_count = pack.black_card_count + pack.white_card_count
+    pack.save(update_fields=['black_card_count', 'white_card_count', 'card_count'])
+  return {'black': created['black'], 'white': created['white']}
+
+
+def _init_worker():
+  django.setup()
+  # Never use connections inherited from the parent - each worker opens its own
+  connections.close_all()
+
+
+def _ready():
+  return True
+
+
+class ParallelCardWriter:
+  """CardBatchWriter's interface, spread over a pool of worker processes.
+
+  Each pack is always routed to the same worker (crc32 of its name), so two
+  workers never write the same pack and per-pack chunks apply in order. A
+  pack's cards are buffered up to batch_size and written by its worker in
+  one transaction.
+  """
+
+  def __init__(self, workers, batch_size=1000, describe_pack=None, progress=None, progress_every=5000):
+    self.batch_size = batch_size
+    self.describe_pack = describe_pack or (lambda name: '')
+    self.progress = progress
+    self.progress_every = progress_every
+
+    self.packs = set()
+    self.buffers = defaultdict(list)
+    self.pending = []
+    self.seen = 0
+    self.created = {'black': 0, 'white': 0}
+    self.errors = []
+    self.started = time.monotonic()
+    self._next_report = progress_every
+
+    # Fork the workers while this process holds no open connections
+    connections.close_all()
+    self.shards = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker) for _ in range(workers)]
+    for shard in self.shards:
+      shard.submit(_ready).result()
+
+  def add(self, pack_name, card_type, text, pick=None):
+    """Queue one card; hands the pack's chunk to its worker once full"""
+    pack_name = pack_name.strip()
+    text = text.strip()
+    if not pack_name or not text:
+      return
+    pick = source_pick(text, pick) if card_type == 'black' else 1
+    self.packs.add(pack_name)
+    buffer = self.buffers[pack_name]
+    buffer.append((card_type, text, pick))
+    self.seen += 1
+    if len(buffer) >= self.batch_size:
+      self._submit(pack_name)
+
+  def _submit(self, pack_name):
+    cards = self.buffers.pop(pack_name)
+    shard = self.shards[zlib.crc32(pack_name.encode()) % len(self.shards)]
+    self.pending.append((pack_name, shard.submit(write_pack_chunk, pack_name, self.describe_pack(pack_name), cards)))
+
+    # Keep only a few chunks in flight per worker so memory stays bounded
+    while len(self.pending) > 4 * len(self.shards):
+      self._collect(*self.pending.pop(0))
+
+  def _collect(self, pack_name, future):
+    try:
+      created = future.result()
+    except Exception as e:
+      self.errors.append((pack_name, e))
+      return
+    for card_type, count in created.items():
+      self.created[card_type] += count
+    if self.progress and self.seen >= self._next_report:
+      self._next_report = self.seen + self.progress_every
+      self.progress(self)
+
+  @property
+  def rate(self):
+    """Cards read per second so far"""
+    elapsed = time.monotonic() - self.started
+    return self.seen / elapsed if elapsed else 0
+
+  def close(self):
+    """Hand off every partly filled pack, wait for the workers and shut them down"""
+    for pack_name in list(self.buffers):
+      self._submit(pack_name)
+    while self.pending:
+      self._collect(*self.pending.pop(0))
+    for shard in self.shards:
+      shard.shutdown()
+
+
+def card_writer(workers=0, **options):
+  """The in-process writer, or a pool of worker processes when workers > 1"""
+  if workers and workers > 1:
+    return ParallelCardWriter(workers, **options)
+  return CardBatchWriter(**options)
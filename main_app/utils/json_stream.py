@@ -0,0 +1,66 @@
+import json
+import re
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_array(fp, chunk_size=64 * 1024):
+  """Yield the items of a top-level JSON array from a text file one at a time.
+
+  The file is read in chunks and each item is decoded with raw_decode as soon
+  as it is complete, so memory holds one item plus one chunk rather than the
+  whole document. An item that is still incomplete after a read doubles the
+  next read, so a large item is decoded a logarithmic number of times rather
+  than once per chunk. Raises ValueError on malformed or truncated input.
+  """
+  decoder = json.JSONDecoder()
+  buffer = ''
+  position = 0
+  eof = False
+  expecting = '['
+  read_size = chunk_size
+
+  while True:
+    position = WHITESPACE.match(buffer, position).end()
+    if position == len(buffer):
+      if eof:
+        raise ValueError('Unexpected end of JSON array')
+      chunk = fp.read(chunk_size)
+      eof = not chunk
+      buffer = buffer[position:] + chunk
+      position = 0
+      continue
+
+    char = buffer[position]
+    if expecting == '[':
+      if char != '[':
+        raise ValueError('Expected a JSON array')
+      position += 1
+      expecting = 'item or ]'
+    elif char == ']' and expecting in ('item or ]', ', or ]'):
+      return
+    elif char == ',' and expecting == ', or ]':
+      position += 1
+      expecting = 'item'
+    elif expecting in ('item', 'item or ]'):
+      try:
+        item, end = decoder.raw_decode(buffer, position)
+      except json.JSONDecodeError:
+        if eof:
+          raise
+        end = None
+      # A value that runs to the end of the buffer (e.g. a number) may continue in the next chunk
+      if end is None or (end == len(buffer) and not eof):
+        chunk = fp.read(read_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+        read_size *= 2
+        continue
+      read_size = chunk_size
+      yield item
+      position = end
+      expecting = ', or ]'
+    else:
+      raise ValueError(f'Unexpected {char!r} in JSON array')
+
@@ -0,0 +1,289 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.utils.module_loading import import_string
+
+try:
+  import fcntl
+except ImportError:  # Windows - the file lock degrades to a per-process lock
+  fcntl = None
+
+# Shared-tier keys used to fan invalidations out to every process
+SEQUENCE_KEY = 'tiered_cache_sequence'
+LOG_KEY = 'tiered_cache_log_{}'
+
+# A shared-tier value set for less than LOCAL_TIMEOUT, with its wall-clock expiry
+ShortLived = namedtuple('ShortLived', 'value expires_at')
+
+# Serializes sequence claims between threads (and TieredCache instances) of one process
+_sequence_mutex = threading.Lock()
+
+
+class TieredCache(BaseCache):
+  """Per-process LRU in front of a shared cache backend.
+
+  Reads are served from local memory when possible. Every write or delete
+  is appended to a small ring-buffer log in the shared tier; each process
+  replays that log at most once per SYNC_INTERVAL and drops the keys other
+  processes changed, so local copies are never staler than that interval.
+  A local copy never outlives its shared entry either: values set for less
+  than LOCAL_TIMEOUT carry their expiry in the shared tier (ShortLived), and
+  a process reading one keeps it locally only for the time it has left.
+
+  OPTIONS:
+    SHARED_BACKEND     dotted path of the shared backend (gets LOCATION and
+                       any remaining OPTIONS)
+    LOCAL_MAX_ENTRIES  size of the per-process LRU (default 1000)
+    LOCAL_TIMEOUT      longest a value lives in the local tier (default 30s)
+    SYNC_INTERVAL      seconds between invalidation log checks (default 1)
+    LOG_SIZE           invalidations kept in the shared log (default 500)
+
+  Culling shared backends (file, locmem) get a MAX_ENTRIES well above
+  LOG_SIZE unless one is given, so the log never evicts real entries. Only
+  Redis has an atomic incr; on other backends sequence numbers are claimed
+  under a lock (a file lock next to a file cache, shared by its processes).
+  """
+
+  def __init__(self, location, params):
+    options = dict(params.get('OPTIONS', {}))
+    shared_backend = options.pop('SHARED_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+    local_max_entries = options.pop('LOCAL_MAX_ENTRIES', 1000)
+    self.local_timeout = options.pop('LOCAL_TIMEOUT', 30)
+    self.sync_interval = options.pop('SYNC_INTERVAL', 1)
+    self.log_size = options.pop('LOG_SIZE', 500)
+
+    super().__init__({**params, 'OPTIONS': {}})
+    shared_class = import_string(shared_backend)
+    self.atomic_incr = issubclass(shared_class, RedisCache)
+    if not self.atomic_incr:
+      options.setdefault('MAX_ENTRIES', max(10000, 20 * self.log_size))
+    self.shared = shared_class(location, {**params, 'OPTIONS': options})
+    self._lock_path = None
+    if issubclass(shared_class, FileBasedCache):
+      os.makedirs(location, exist_ok=True)
+      self._lock_path = os.path.join(location, 'tiered_cache.lock')
+    self.local = LocMemCache(f'tiered-{id(self)}', {
+      'TIMEOUT': self.local_timeout,
+      'OPTIONS': {'MAX_ENTRIES': local_max_entries},
+    })
+
+    self._lock = threading.Lock()
+    self._seen_sequence = None
+    self._next_sync = 0
+    self._counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations_applied': 0}
+
+  # Stats
+
+  def _count(self, name, amount=1):
+    with self._lock:
+      self._counters[name] += amount
+
+  def stats(self):
+    """Hit/miss counters for this process"""
+    with self._lock:
+      stats = dict(self._counters)
+    lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 3) if lookups else 0
+    return stats
+
+  # Invalidation fan-out
+
+  def _local_timeout(self, timeout):
+    if timeout is DEFAULT_TIMEOUT:
+      timeout = self.default_timeout
+    if timeout is None:
+      return self.local_timeout
+    return min(timeout, self.local_timeout)
+
+  def _short_lived(self, timeout):
+    """Whether a value set with this timeout ends before a local copy of it would"""
+    if timeout is DEFAULT_TIMEOUT:
+      timeout = self.default_timeout
+    return timeout is not None and 0 < timeout < self.local_timeout
+
+  def _wrap(self, value, timeout):
+    """The value to store in the shared tier, with its expiry if it is short-lived"""
+    if self._short_lived(timeout):
+      if timeout is DEFAULT_TIMEOUT:
+        timeout = self.default_timeout
+      return ShortLived(value, time.time() + timeout)
+    return value
+
+  def _unwrap(self, entry):
+    """A shared-tier entry's value and how long a local copy may keep it (None once expired)"""
+    if isinstance(entry, ShortLived):
+      remaining = entry.expires_at - time.time()
+      return entry.value, (remaining if remaining > 0 else None)
+    return entry, self.local_timeout
+
+  @contextmanager
+  def _sequence_lock(self):
+    """Hold off other claims of the next sequence number where incr isn't atomic"""
+    if self.atomic_incr:
+      yield
+      return
+    with _sequence_mutex:
+      if self._lock_path is None or fcntl is None:
+        yield
+        return
+      with open(self._lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+          yield
+        finally:
+          fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+  def _announce(self, key, version):
+    """Record a changed key (None means everything) in the shared log"""
+    with self._sequence_lock():
+      self.shared.add(SEQUENCE_KEY, 0, timeout=None)
+      try:
+        sequence = self.shared.incr(SEQUENCE_KEY)
+      except ValueError:
+        # Sequence expired between add and incr - start over
+        self.shared.set(SEQUENCE_KEY, 1, timeout=None)
+        sequence = 1
+    self.shared.set(LOG_KEY.format(sequence % self.log_size), (sequence, key, version), timeout=None)
+    with self._lock:
+      # Our own change is already applied locally
+      if self._seen_sequence == sequence - 1:
+        self._seen_sequence = sequence
+
+  def _sync(self):
+    """Drop local entries that other processes changed since the last check"""
+    now = time.monotonic()
+    if now < self._next_sync:
+      return
+    self._next_sync = now + self.sync_interval
+
+    latest = self.shared.get(SEQUENCE_KEY, 0)
+    seen = self._seen_sequence
+    if seen is None or latest < seen:
+      # First check, or the shared tier was reset - nothing local can be trusted
+      self.local.clear()
+    elif latest - seen > self.log_size:
+      # Fell too far behind to replay the log
+      self.local.clear()
+    elif latest > seen:
+      wanted = {LOG_KEY.format(sequence % self.log_size): sequence for sequence in range(seen + 1, latest + 1)}
+      entries = self.shared.get_many(wanted.keys())
+      for log_key, sequence in wanted.items():
+        entry = entries.get(log_key)
+        if entry is None or entry[0] != sequence or entry[1] is None:
+          # Missing entries or a clear() - drop everything
+          self.local.clear()
+          break
+        self.local.delete(entry[1], version=entry[2])
+      self._count('invalidations_applied', latest - seen)
+    self._seen_sequence = latest
+
+  # Cache API
+
+  def get(self, key, default=None, version=None):
+    self._sync()
+    sentinel = object()
+    value = self.local.get(key, sentinel, version=version)
+    if value is not sentinel:
+      self._count('local_hits')
+      return value
+
+    value, local_timeout = self._unwrap(self.shared.get(key, sentinel, version=version))
+    if value is sentinel or local_timeout is None:
+      self._count('misses')
+      return default
+
+    self._count('shared_hits')
+    self.local.set(key, value, timeout=local_timeout, version=version)
+    return value
+
+  def get_many(self, keys, version=None):
+    self._sync()
+    sentinel = object()
+    found = {}
+    remaining = []
+    for key in keys:
+      value = self.local.get(key, sentinel, version=version)
+      if value is sentinel:
+        remaining.append(key)
+      else:
+        found[key] = value
+    self._count('local_hits', len(found))
+
+    if remaining:
+      shared_values = {}
+      for key, entry in self.shared.get_many(remaining, version=version).items():
+        value, local_timeout = self._unwrap(entry)
+        if local_timeout is not None:
+          self.local.set(key, value, timeout=local_timeout, version=version)
+          shared_values[key] = value
+      found.update(shared_values)
+      self._count('shared_hits', len(shared_values))
+      self._count('misses', len(remaining) - len(shared_values))
+    return found
+
+  def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    self.shared.set(key, self._wrap(value, timeout), timeout=timeout, version=version)
+    self.local.set(key, value, timeout=self._local_timeout(timeout), version=version)
+    self._announce(key, version)
+
+  def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    added = self.shared.add(key, self._wrap(value, timeout), timeout=timeout, version=version)
+    if added:
+      self.local.set(key, value, timeout=self._local_timeout(timeout), version=version)
+      self._announce(key, version)
+    return added
+
+  def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+    entry = self.shared.get(key, version=version)
+    if isinstance(entry, ShortLived) or (entry is not None and self._short_lived(timeout)):
+      # The stored expiry has to move with the new timeout
+      value, local_timeout = self._unwrap(entry)
+      if local_timeout is None:
+        return False
+      self.set(key, value, timeout=timeout, version=version)
+      return True
+    self.local.touch(key, timeout=self._local_timeout(timeout), version=version)
+    return self.shared.touch(key, timeout=timeout, version=version)
+
+  def delete(self, key, version=None):
+    self.local.delete(key, version=version)
+    deleted = self.shared.delete(key, version=version)
+    self._announce(key, version)
+    return deleted
+
+  def delete_many(self, keys, version=None):
+    for key in keys:
+      self.delete(key, version=version)
+
+  def has_key(self, key, version=None):
+    self._sync()
+    return self.local.has_key(key, version=version) or self.shared.has_key(key, version=version)
+
+  def incr(self, key, delta=1, version=None):
+    entry = self.shared.get(key, version=version)
+    if isinstance(entry, ShortLived):
+      # A short-lived counter keeps its expiry - read and rewritten, so not atomic like incr
+      value, remaining = self._unwrap(entry)
+      if remaining is None:
+        raise ValueError(f"Key '{key}' not found")
+      value += delta
+      self.set(key, value, timeout=remaining, version=version)
+      return value
+    value = self.shared.incr(key, delta, version=version)
+    self.local.delete(key, version=version)
+    self._announce(key, version)
+    return value
+
+  def clear(self):
+    self.local.clear()
+    self.shared.clear()
+    self._announce(None, None)
+
+  def close(self, **kwargs):
+    self.shared.close(**kwargs)
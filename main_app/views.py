@@ -1,4 +1,6 @@
+import os
 import requests
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.views.generic import DetailView, ListView
@@ -6,16 +8,20 @@ from django.db.models import Q, Count
 from django.core.paginator import Paginator
 from django.contrib.auth import login
 from django.contrib.auth.views import LoginView, LogoutView
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.utils import timezone
 from .forms import SignUpForm, ProfileEditForm
 from .services import GameService
+from .read_models import load_game_screen
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.cache import cache_control
 from .models import Room, Game, GamePlayer, CardSubmission, RoomMembership, CardPack
 from django.db.models import Max
 from django.core.cache import cache
+from .realtime import invalidate_game_status_cache, invalidate_member_rooms
+from . import card_pools, leaderboards
 
 # Create your views here.
 def home(request):
@@ -50,6 +56,8 @@ def dashboard(request):
         # Add selected packs to the room
         if selected_pack_ids:
             room.selected_packs.set(selected_pack_ids)
+        # Resolve its card pool now rather than on every game start
+        card_pools.assign_room_pool(room)
         
         # Add creator as member
         RoomMembership.objects.create(
@@ -170,6 +178,7 @@ def join_room(request):
                     # Reactivate membership for previously kicked user
                     existing_membership.is_active = True
                     existing_membership.save()
+                    invalidate_game_status_cache(room.room_code)
                     messages.success(request, f"Successfully rejoined {room.name}!")
             else:
                 # Add user to room
@@ -177,6 +186,7 @@ def join_room(request):
                     user=request.user,
                     room=room
                 )
+                invalidate_game_status_cache(room.room_code)
                 messages.success(request, f"Successfully joined {room.name}!")
             
             return redirect('room', room_code=room.room_code)
@@ -282,6 +292,8 @@ def edit_profile(request):
             if 'avatar' in request.FILES:
                 user.avatar_url = request.FILES['avatar']
             user.save()
+            # Lobbies show the player's name and avatar
+            invalidate_member_rooms(user)
             
             if new_email == original_email:
                 messages.success(request, 'Profile updated successfully!')
@@ -332,9 +344,11 @@ def start_game(request, room_code):
         game = GameService.create_game(room)
     
     # Start the game
-    GameService.start_game(game)
-    game.status = 'active'
-    game.save() 
+    try:
+        GameService.start_game(game)
+    except Exception as e:
+        messages.info(request, str(e))
+        return redirect('game_play', room_code=room_code)
     invalidate_game_status_cache(room_code)
 
     return redirect('game_play', room_code=room_code)
@@ -342,91 +356,40 @@ def start_game(request, room_code):
 @login_required
 def game_play(request, room_code):
     """Main game interface"""
-    room = get_object_or_404(Room, room_code=room_code, is_active=True)
-    game = get_object_or_404(Game, room=room)
-
-    # Get current player
     try:
-        player = game.players.get(user=request.user)
+        context = load_game_screen(room_code, request.user)
     except GamePlayer.DoesNotExist:
         messages.error(request, "You are not in this game")
         return redirect('dashboard')
 
-    # Get current round
-    current_round = game.rounds.order_by('-round_number').first()
-
-    # Check if player already submitted
-    has_submitted = False
-    if current_round:
-        has_submitted = CardSubmission.objects.filter(
-            round=current_round,
-            player=player
-        ).exists()
-
-    # Get all submissions
-    submissions = []
-    if current_round:
-        submissions = current_round.submissions.all()
-
-    # Calculate remaining time if there's an active round
-    remaining_time = None
-    if current_round and current_round.status in ['card_selection', 'judging']:
-      elapsed = (timezone.now() - current_round.phase_start_time).total_seconds()
-      remaining_time = max(0, room.turn_time_limit - int(elapsed))
-
-    context = {
-        'room': room,
-        'game': game,
-        'player': player,
-        'current_round': current_round,
-        'is_judge': current_round and current_round.judge == request.user,
-        'is_creator': room.creator == request.user,
-        'has_submitted': has_submitted,
-        'submissions': submissions,
-        'players': game.players.all(),
-        'remaining_time': remaining_time, 
-    }
-
     return render(request, 'game-play.html', context)
 
 @login_required
 @require_POST
 def submit_card(request, room_code):
-    """Player submits a white card"""
+    """Player submits white cards, in the order they fill the black card's blanks"""
     room = get_object_or_404(Room, room_code=room_code)
-    game = get_object_or_404(Game, room=room, status='active')
+    game = get_object_or_404(Game.objects.select_related('current_round'), room=room, status='active')
     player = get_object_or_404(GamePlayer, game=game, user=request.user)
 
-    current_round = game.rounds.order_by('-round_number').first()
+    current_round = game.current_round
     if not current_round or current_round.status != 'card_selection':
         messages.error(request, "Cannot submit cards right now")
         return redirect('game_play', room_code=room_code)
 
-    card_id = request.POST.get('card_id')
-    if not card_id:
+    card_ids = request.POST.getlist('card_ids')
+    if not card_ids:
         messages.error(request, "Please select a card")
         return redirect('game_play', room_code=room_code)
 
     try:
-        GameService.submit_card(player, current_round, card_id)
+        # Also moves the round to judging once everyone has submitted
+        GameService.submit_card(player, current_round, card_ids)
         messages.success(request, "Card submitted!")
-        
+
         # Invalidate cache to ensure fresh data
         invalidate_game_status_cache(room_code)
 
-        # Check if all players submitted
-        expected_submissions = game.players.filter(is_active=True).exclude(
-            user=current_round.judge
-        ).count()
-        actual_submissions = current_round.submissions.count()
-
-        if actual_submissions >= expected_submissions:
-            # Move to judging phase
-            current_round.status = 'judging'
-            current_round.phase_start_time = timezone.now()
-            current_round.save()
-            invalidate_game_status_cache(room_code)
-
     except Exception as e:
         messages.error(request, str(e))
 
@@ -437,14 +400,14 @@ def submit_card(request, room_code):
 def select_winner(request, room_code):
     """Judge selects winning submission"""
     room = get_object_or_404(Room, room_code=room_code)
-    game = get_object_or_404(Game, room=room, status='active')
+    game = get_object_or_404(Game.objects.select_related('current_round'), room=room, status='active')
 
-    current_round = game.rounds.order_by('-round_number').first()
+    current_round = game.current_round
     if not current_round or current_round.status != 'judging':
         messages.error(request, "Cannot judge right now")
         return redirect('game_play', room_code=room_code)
 
-    if current_round.judge != request.user:
+    if current_round.judge_id != request.user.id:
         messages.error(request, "Only the judge can select a winner")
         return redirect('game_play', room_code=room_code)
 
@@ -517,9 +480,9 @@ def kick_player(request, room_code, user_id):
                 game_player = room.game.players.get(user_id=user_id)
                 game_player.is_active = False
                 game_player.save()
-                invalidate_game_status_cache(room_code)
         except (Game.DoesNotExist, GamePlayer.DoesNotExist):
             pass
+        invalidate_game_status_cache(room_code)
         
         kicked_user = membership.user
         messages.success(request, f"{kicked_user.username} has been removed from the room")
@@ -529,7 +492,18 @@ def kick_player(request, room_code, user_id):
     
     return redirect('room', room_code=room_code)
 
+def room_state_etag(request, room_code):
+    """ETag for a room's polling endpoints, taken from its state version"""
+    version = Room.objects.filter(room_code=room_code).values_list('state_version', flat=True).first()
+    # Kept for the view, so the body it serves belongs to the same version as the ETag
+    request.room_state_version = version
+    if version is None:
+        return None
+    return f'{room_code}-{version}'
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=room_state_etag)
 def lobby_status(request, room_code):
     """Get lobby status for AJAX polling"""
     room = get_object_or_404(Room, room_code=room_code, is_active=True)
@@ -565,10 +539,12 @@ def lobby_status(request, room_code):
         'game_status': 'waiting'
     })
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=room_state_etag)
 def game_status(request, room_code):
     """Get current game status for polling"""
-    # Create cache key
-    cache_key = f'game_status_{room_code}'
+    # Cache key per state version - a body cached for an older version can never be served under this ETag
+    cache_key = f'game_status_{room_code}_{request.room_state_version}'
     
     # Try to get from cache first
     cached_data = cache.get(cache_key)
@@ -578,16 +554,13 @@ def game_status(request, room_code):
     # If not in cache, fetch from database
     room = get_object_or_404(Room, room_code=room_code)
     try:
-        game = Game.objects.get(room=room)
-        current_round = game.rounds.order_by('-round_number').first() if game else None
-        # Count submissions
-        submissions_count = 0
-        if current_round:
-            submissions_count = current_round.submissions.count()
+        game = Game.objects.select_related('current_round').get(room=room)
+        current_round = game.current_round
+        submissions_count = current_round.submission_count if current_round else 0
         data = {
             'game_status': game.status,
             'round_status': current_round.status if current_round else None,
-            'round_number': current_round.round_number if current_round else 0,
+            'round_number': game.current_round_number,
             'submissions_count': submissions_count,
             'total_players': game.players.filter(is_active=True).count() if game else 0,
         }
@@ -606,17 +579,53 @@ def game_status(request, room_code):
     
     return JsonResponse(data)
 
-def invalidate_game_status_cache(room_code):
-    """Invalidate the game status cache for a specific room"""
-    cache_key = f'game_status_{room_code}'
-    cache.delete(cache_key)
+@user_passes_test(lambda user: user.is_staff)
+def cache_stats(request):
+    """Hit/miss counters for this worker's cache tiers (staff only)"""
+    stats = cache.stats() if hasattr(cache, 'stats') else {}
+    return JsonResponse({'pid': os.getpid(), 'backend': type(cache).__name__, **stats})
+
+@login_required
+def leaderboard(request):
+    """One page of a leaderboard plus the current user's rank, as JSON.
+
+    ?board=global (default) or week, or ?room=<code> for a room's history;
+    ?cursor= continues from the previous page's next_cursor.
+    """
+    room_code = request.GET.get('room')
+    if room_code:
+        board = leaderboards.room_board(room_code)
+    elif request.GET.get('board') == 'week':
+        board = leaderboards.week_board()
+    else:
+        board = leaderboards.GLOBAL_BOARD
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 25)), 1), 100)
+        entries, next_cursor = leaderboards.get_page(board, limit, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+
+    rank, mine = leaderboards.get_rank(board, request.user)
+    return JsonResponse({
+        'board': board,
+        'entries': [{
+            'username': entry.user.username,
+            'games_played': entry.games_played,
+            'games_won': entry.games_won,
+            'total_score': entry.total_score,
+        } for entry in entries],
+        'next_cursor': next_cursor,
+        'my_rank': rank,
+        'my_games_won': mine.games_won if mine else 0,
+    })
 
 @login_required
 def check_timer(request, room_code):
   """Check remaining time and auto-advance if expired"""
   room = get_object_or_404(Room, room_code=room_code)
-  game = get_object_or_404(Game, room=room, status='active')
-  current_round = game.rounds.order_by('-round_number').first()
+  game = get_object_or_404(Game.objects.select_related('current_round'), room=room, status='active')
+  current_round = game.current_round
 
   if not current_round:
     return JsonResponse({'remaining': 0, 'phase_changed': False})
@@ -626,32 +635,27 @@ def check_timer(request, room_code):
 
   phase_changed = False
 
-# Auto-advance if time expired
-  if remaining == 0:
-    if current_round.status == 'card_selection':
-      # Force advance to judging
-      current_round.status = 'judging'
-      current_round.phase_start_time = timezone.now()
-      current_round.save()
+  # Auto-advance if time expired, unless the timer worker owns transitions
+  if remaining == 0 and not settings.ROUND_TIMER_WORKER:
+    phase_changed = GameService.advance_expired_round(current_round.id)
+    if phase_changed:
       invalidate_game_status_cache(room_code)
-      phase_changed = True
-    elif current_round.status == 'judging':
-      # Auto-select random winner or skip round
-      submissions = current_round.submissions.all()
-      if submissions:
-        import random
-        winner = random.choice(submissions)
-        judge_player = game.players.get(user=current_round.judge)
-        GameService.select_winner(current_round, str(winner.id), judge_player)
-      else:
-        # No submissions, start next round
-        GameService.create_round(game)
-      phase_changed = True
+      # Re-read through the game - the round may have been replaced, or archived with the game
+      game = Game.objects.select_related('current_round').get(pk=game.pk)
+      if game.status == 'ended' or not game.current_round:
+        return JsonResponse({
+          'remaining': 0,
+          'phase_changed': True,
+          'current_phase': 'ended',
+          'round_number': game.current_round_number
+        })
+      current_round = game.current_round
 
   return JsonResponse({
     'remaining': remaining,
     'phase_changed': phase_changed,
-    'current_phase': current_round.status
+    'current_phase': current_round.status,
+    'round_number': current_round.round_number
   })    
 
 @login_required
@@ -694,8 +698,11 @@ def delete_account(request):
     password = request.POST.get('password')
     
     if request.user.check_password(password):
-        # Deactivate all room memberships
+        # Deactivate all room memberships, moving those lobbies to a new version
+        room_codes = list(request.user.room_memberships.filter(is_active=True).values_list('room__room_code', flat=True))
         request.user.room_memberships.update(is_active=False)
+        for room_code in room_codes:
+            invalidate_game_status_cache(room_code)
         # Delete the user
         request.user.delete()
         messages.success(request, 'Your account has been deleted.')
@@ -737,7 +744,11 @@ def end_game(request, room_code):
         messages.error(request, "Only the room creator can end the game")
         return redirect('game_play', room_code=room_code)
     # End the game using the service
-    GameService.end_game_early(game)
+    try:
+        GameService.end_game_early(game)
+    except Exception as e:
+        messages.info(request, str(e))
+        return redirect('game_results', room_code=room_code)
     invalidate_game_status_cache(room_code)
     messages.success(request, "Game ended early!")
     return redirect('game_results', room_code=room_code)
@@ -2,15 +2,34 @@
 ASGI config for mergeconflict project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; WebSocket connections to ``/ws/room/<code>/``
+receive live room updates.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mergeconflict.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up so the app registry is ready
+from main_app.consumers import room_socket  # noqa: E402
+
+ROOM_SOCKET_PATH = re.compile(r'^/ws/room/(?P<room_code>\w+)/$')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        match = ROOM_SOCKET_PATH.match(scope['path'])
+        if match:
+            return await room_socket(scope, receive, send, match.group('room_code'))
+        await receive()
+        await send({'type': 'websocket.close'})
+        return
+    return await django_application(scope, receive, send)
@@ -182,17 +182,39 @@ EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = f'Merge Conflict Game <{env("EMAIL_HOST_USER")}>'
 SERVER_EMAIL = env('EMAIL_HOST_USER')
 
+# Two-tier cache: a per-process LRU in front of a shared backend. The shared
+# tier is Redis when REDIS_URL is set, otherwise files on local disk (shared by
+# all workers on the same machine). Writes fan out as invalidations to the
+# other processes' local tiers - see main_app/utils/tiered_cache.py.
+REDIS_URL = env('REDIS_URL', default=None)
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'cards_cache_table',
+        'BACKEND': 'main_app.utils.tiered_cache.TieredCache',
+        'LOCATION': REDIS_URL or env('CACHE_DIR', default=os.path.join(BASE_DIR, '.cache')),
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,
-            'CULL_FREQUENCY': 3,  # Remove 1/3 of entries when MAX_ENTRIES is reached
+            'SHARED_BACKEND': (
+                'django.core.cache.backends.redis.RedisCache' if REDIS_URL
+                else 'django.core.cache.backends.filebased.FileBasedCache'
+            ),
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 30,  # Longest a value lives in process memory
+            'SYNC_INTERVAL': 1,   # Seconds between checks for other processes' writes
         }
     }
 }
 
+# Pub/sub used to push room updates to WebSocket clients (see mergeconflict/asgi.py).
+# The in-process broker only reaches sockets served by the same process: with
+# several web workers, or with run_round_timer advancing rounds, set REDIS_URL
+# so every process publishes through Redis. Without it, timer transitions still
+# reach the game page through its check_timer poll, just not instantly.
+REALTIME_BROKER = 'main_app.realtime.RedisBroker' if REDIS_URL else 'main_app.realtime.InProcessBroker'
+
+# When True, round timers are advanced by the `run_round_timer` worker process
+# and check_timer only reports the remaining time.
+ROUND_TIMER_WORKER = env.bool('ROUND_TIMER_WORKER', default=False)
+
 CACHE_TTL = {
     'api_packs': 86400,    # 24 hours for pack list
     'api_cards': 3600,     # 1 hour for cards